@@ -0,0 +1,475 @@
+"""
+Benchmarks of the language prediction pipeline, reported as JSON.
+
+earlyExit: scores LangId.test, and long documents made by joining the test lines of each language, with every n-gram
+and with scoring.BatchScorer.scoreEarlyExit at several margins. Reports the time, accuracy and share of n-grams
+scored of each setting.
+
+pruning: trains the add one, Good Turing and Kneser-Ney word models once, then prunes and quantizes them with several settings.
+Reports the bigrams kept, the size of the scoring tables and the accuracy on LangId.test of each setting.
+
+smoothing: trains the add one, Good Turing and Kneser-Ney word models from the same counts. Reports the build time,
+scoring throughput, table size and accuracy on LangId.test lines and on short inputs made of their first words.
+
+startup: times fresh processes classifying one line with langId.py predict, next to an empty interpreter, a bare
+numpy import and a script that predicts through wordLangId2.py predict. Reports the time to the first
+prediction and whether it is within --startupTarget milliseconds, exiting with status 1 if it is not.
+
+stages: times each stage of training and prediction on the bundled corpora and on synthetic corpora made by
+resampling their lines, 10 to 1000 times larger. Reports the wall and CPU time, peak traced memory and throughput of
+each stage at each scale, and how much slower per line each stage gets than at the smallest scale.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import subprocess
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from engine import NgramCounter, Vocabulary, pruneModel, bigramFrequencies
+from helper import readCorpus, loadSolution, iterBatches, CorpusReader, createOOV, predictLanguage, writeResults
+from scoring import BatchScorer
+from registry import languageCorpora
+from modelStore import loadScorer
+
+parser = argparse.ArgumentParser(description='Language prediction benchmarks')
+parser.add_argument('benchmarks', nargs='*', default=['earlyExit', 'pruning', 'smoothing', 'startup', 'stages'], help='Benchmarks to run: earlyExit, pruning, smoothing, startup, stages')
+parser.add_argument('--englishPath', default='LangId.train.English', help='Input path for English corpus')
+parser.add_argument('--frenchPath', default='LangId.train.French', help='Input path for French corpus')
+parser.add_argument('--italianPath', default='LangId.train.Italian', help='Input path for Italian corpus')
+parser.add_argument('--trainDir', default=None, help='Directory of LangId.train.<Language> corpora, one per language to identify')
+parser.add_argument('--manifest', default=None, help='File listing a language and its training corpus path on each line')
+parser.add_argument('--modelPath', default='wordLangId2.model', help='Path of the binary model file written by train')
+parser.add_argument('--testPath', default='LangId.test', help='Input path for test corpus')
+parser.add_argument('--solutionPath', default='LangId.sol', help='Input path for solution')
+parser.add_argument('--docLines', default=20, type=int, help='Number of test lines joined into each long document')
+parser.add_argument('--repeat', default=5, type=int, help='Number of timed runs of each setting, the fastest is reported')
+parser.add_argument('--scales', nargs='+', default=[1, 10, 100], type=float, help='Sizes of the corpora timed by the stages benchmark, as multiples of the bundled corpora')
+parser.add_argument('--seed', default=0, type=int, help='Seed of the line resampling of the synthetic corpora')
+parser.add_argument('--workDir', default=None, help='Directory the synthetic corpora are written to, a temporary directory if omitted')
+parser.add_argument('--noMemory', action='store_true', help='Skip the traced rerun of each stage that measures its peak memory')
+parser.add_argument('--startupText', default='Signora Presidente, onorevoli colleghi', help='Line classified by the startup benchmark')
+parser.add_argument('--startupTarget', default=250.0, type=float, help='Longest acceptable time to the first prediction of langId.py predict, in milliseconds')
+parser.add_argument('--outputPath', default=None, help='Path to write the JSON report to instead of printing it')
+
+EARLY_EXIT_SETTINGS = [(None, None, 16), (40.0, 80.0, 16), (20.0, 40.0, 8), (10.0, 20.0, 4), (5.0, 10.0, 2)]
+SMOOTHING_PREFIX_WORDS = [1, 2, 3, 5]
+PRUNING_SETTINGS = [{}, {'minCount': 2}, {'minCount': 3}, {'topK': 20000}, {'topK': 5000}, {'topK': 2000},
+                    {'entropyThreshold': 1e-4}, {'entropyThreshold': 1e-3}, {'quantizeBits': 16}, {'quantizeBits': 8},
+                    {'minCount': 2, 'quantizeBits': 8}, {'topK': 5000, 'quantizeBits': 8}]
+
+def longDocuments(lines, solution, docLines):
+    """ Join the test lines of each language, in order, into documents of at most docLines lines
+
+    Args:
+        lines (list): cleaned test lines
+        solution (list): language of each line
+        docLines (int): largest number of lines joined into a document
+
+    Returns:
+        documents (list): the joined documents
+        labels (list): language of each document
+    """
+    byLanguage = {}
+    for line, language in zip(lines, solution):
+        byLanguage.setdefault(language, []).append(line)
+    documents = []
+    labels = []
+    for language, languageLines in byLanguage.items():
+        for batch in iterBatches(languageLines, docLines):
+            documents.append(' '.join(batch))
+            labels.append(language)
+    return documents, labels
+
+def timeBest(function, repeat):
+    """ Call a function repeat times and return its result and the fastest wall time in seconds """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+def benchEarlyExit(scorer, lines, labels, settings=EARLY_EXIT_SETTINGS, repeat=5, batchSize=1024):
+    """ Time full and early exit scoring of a set of lines and measure the accuracy of each setting
+
+    Args:
+        scorer (scoring.BatchScorer): scorer loaded from a model file
+        lines (list): cleaned lines to classify
+        labels (list): language of each line
+        settings (list): (pruneMargin, decisiveMargin, blockSize) tuples, None margins score every n-gram
+        repeat (int): number of timed runs of each setting
+        batchSize (int): number of lines scored at once
+
+    Returns:
+        results (list): a dictionary of timings and accuracy for each setting
+    """
+    logger = logging.getLogger(__name__)
+    ngramCounts = np.concatenate([scorer.encodeLines(batch)[1] - (scorer.order - 1) for batch in iterBatches(lines, batchSize)])
+    results = []
+    for pruneMargin, decisiveMargin, blockSize in settings:
+        logger.info('Scoring {0} lines with margins {1}/{2}'.format(len(lines), pruneMargin, decisiveMargin))
+
+        def run():
+            scores = []
+            consumed = []
+            margins = []
+            for batch in iterBatches(lines, batchSize):
+                if pruneMargin is None:
+                    batchScores = scorer.score(batch)
+                    batchConsumed = None
+                    batchMargins = np.full(len(batch), np.nan)
+                else:
+                    batchScores, batchConsumed, batchMargins = scorer.scoreEarlyExit(batch, pruneMargin, decisiveMargin, blockSize)
+                scores.append(batchScores)
+                consumed.append(batchConsumed)
+                margins.append(batchMargins)
+            consumed = ngramCounts if pruneMargin is None else np.concatenate(consumed)
+            return np.concatenate(scores), consumed, np.concatenate(margins)
+
+        (scores, consumed, margins), seconds = timeBest(run, repeat)
+        predictions = [scorer.languages[i] for i in np.argmax(scores, axis=1).tolist()]
+        correct = sum(1 for p, l in zip(predictions, labels) if p == l)
+        finite = margins[np.isfinite(margins)]
+        results.append({'pruneMargin': pruneMargin, 'decisiveMargin': decisiveMargin, 'blockSize': blockSize,
+                        'seconds': seconds, 'linesPerSecond': len(lines) / seconds,
+                        'correct': correct, 'accuracy': correct / len(labels),
+                        'ngramsScored': int(consumed.sum()), 'ngramShare': float(consumed.sum() / ngramCounts.sum()),
+                        'medianFinalMargin': float(np.median(finite)) if len(finite) else None})
+    return results
+
+def wordBuilders(unkThreshold=0):
+    """ Return a function building each smoothing's word model of a language from its counts, keyed by smoothing """
+    import wordLangId
+    import wordLangId2
+
+    return {'addOne': lambda language, counter: wordLangId.wordModel([], unkThreshold, language, counter=counter),
+            'GT': lambda language, counter: wordLangId2.wordModel([], unkThreshold, language, 'GT', counter=counter),
+            'KN': lambda language, counter: wordLangId2.wordModel([], unkThreshold, language, 'KN', counter=counter)}
+
+def benchSmoothing(corpora, lines, labels, prefixWords=SMOOTHING_PREFIX_WORDS, repeat=5, unkThreshold=0, timedCopies=20):
+    """ Train the word models with each smoothing from the same counts and measure their speed and accuracy
+
+    Short inputs are made by keeping only the first few words of each line, as unseen bigrams weigh most there.
+
+    Args:
+        corpora (dict): a dictionary of language keys and training corpus values
+        lines (list): cleaned lines to classify
+        labels (list): language of each line
+        prefixWords (list): numbers of leading words of each line classified as short inputs
+        repeat (int): number of timed scoring runs, the fastest is reported
+        unkThreshold (int): frequency threshold to be included in vocabulary
+        timedCopies (int): number of copies of the lines scored in each timed run, so the timing is not dominated by noise
+
+    Returns:
+        results (dict): build and scoring times, table size and accuracy on whole lines and short inputs, keyed by smoothing
+    """
+    logger = logging.getLogger(__name__)
+    counters = {}
+    for language, corpus in corpora.items():
+        counters[language] = NgramCounter(wordModel=True)
+        counters[language].update(corpus)
+    inputs = {'lines': lines}
+    for words in prefixWords:
+        inputs['{0}Words'.format(words)] = [' '.join(line.split()[:words]) for line in lines]
+
+    results = {}
+    for smoothing, builder in wordBuilders(unkThreshold).items():
+        logger.info('Benchmarking {0} word models'.format(smoothing))
+        started = time.perf_counter()
+        scorer = BatchScorer([builder(language, counter) for language, counter in counters.items()])
+        buildSeconds = time.perf_counter() - started
+        result = {'buildSeconds': buildSeconds, 'tableBytes': scorer.nbytes}
+        timedLines = lines * timedCopies
+        _, seconds = timeBest(lambda: [scorer.predict(batch) for batch in iterBatches(timedLines, 1024)], repeat)
+        result['linesPerSecond'] = len(timedLines) / seconds
+        for name, batch in inputs.items():
+            predictions = [prediction for part in iterBatches(batch, 1024) for prediction in scorer.predict(part)]
+            correct = sum(1 for p, l in zip(predictions, labels) if p == l)
+            result[name] = {'correct': correct, 'accuracy': correct / len(labels)}
+        results[smoothing] = result
+    return results
+
+def benchPruning(corpora, lines, labels, settings=PRUNING_SETTINGS, unkThreshold=0):
+    """ Train the word models once, then measure the size and accuracy of each pruning and quantization setting
+
+    Args:
+        corpora (dict): a dictionary of language keys and training corpus values
+        lines (list): cleaned lines to classify
+        labels (list): language of each line
+        settings (list): dictionaries of minCount, topK, entropyThreshold and quantizeBits values, see engine.pruneModel
+        unkThreshold (int): frequency threshold to be included in vocabulary
+
+    Returns:
+        results (dict): a list of dictionaries of sizes and accuracy for each setting, keyed by smoothing
+    """
+    logger = logging.getLogger(__name__)
+    counters = {}
+    for language, corpus in corpora.items():
+        counters[language] = NgramCounter(wordModel=True)
+        counters[language].update(corpus)
+    builders = wordBuilders(unkThreshold)
+
+    results = {}
+    for smoothing, builder in builders.items():
+        models = [builder(language, counter) for language, counter in counters.items()]
+        counts = [counters[model.language].bigramCounts(model.vocab, dense=False) for model in models]
+        results[smoothing] = []
+        for setting in settings:
+            logger.info('Pruning {0} word models with {1}'.format(smoothing, setting))
+            pruned = [pruneModel(model, modelCounts, setting.get('minCount', 0), setting.get('topK'),
+                                 setting.get('entropyThreshold')) for model, modelCounts in zip(models, counts)]
+            scorer = BatchScorer(pruned)
+            if setting.get('quantizeBits'):
+                scorer.quantize(setting['quantizeBits'])
+            predictions = [prediction for batch in iterBatches(lines, 1024) for prediction in scorer.predict(batch)]
+            correct = sum(1 for p, l in zip(predictions, labels) if p == l)
+            results[smoothing].append(dict(setting, bigrams=int(sum(len(model.seenBigrams()[2]) for model in pruned)),
+                                           tableBytes=scorer.nbytes, correct=correct, accuracy=correct / len(labels)))
+    return results
+
+def benchStartup(modelPath, text, repeat=5, targetMs=None):
+    """ Time fresh processes that classify one line, from starting the interpreter to exiting after the prediction
+
+    The unified CLI is compared with an interpreter that does nothing, a bare numpy import, which every prediction
+    needs, and the wordLangId2.py script predicting the same line from the same model file.
+
+    Args:
+        modelPath (str): filepath to the model file written by train
+        text (str): line to classify
+        repeat (int): number of processes started for each command, the fastest and median are reported
+        targetMs (float): longest acceptable time to the first prediction of the CLI in milliseconds, or None
+
+    Returns:
+        report (dict): fastest and median milliseconds of each command, the CLI's prediction and whether it is within target
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Timing {0} process starts per command'.format(repeat))
+
+    workDir = tempfile.mkdtemp(prefix='langIdStartup')
+    try:
+        testPath = os.path.join(workDir, 'startup.test')
+        solutionPath = os.path.join(workDir, 'startup.sol')
+        with open(testPath, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        with open(solutionPath, 'w') as f:
+            f.write('1 English\n')
+        commands = {
+            'interpreter': [sys.executable, '-c', 'pass'],
+            'numpyImport': [sys.executable, '-c', 'import numpy'],
+            'langIdPredict': [sys.executable, 'langId.py', 'predict', '--modelPath', modelPath, text],
+            'scriptPredict': [sys.executable, 'wordLangId2.py', 'predict', '--modelPath', modelPath, '--testPath', testPath,
+                              '--solutionPath', solutionPath, '--outputPath', os.path.join(workDir, 'startup.out')],
+        }
+        report = {}
+        for name, command in commands.items():
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+                times.append((time.perf_counter() - started) * 1000)
+            report[name] = {'bestMs': min(times), 'medianMs': float(np.median(times))}
+            if name == 'langIdPredict':
+                report[name]['prediction'] = completed.stdout.decode('utf-8').split()[1]
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    report['targetMs'] = targetMs
+    report['withinTarget'] = targetMs is None or report['langIdPredict']['medianMs'] <= targetMs
+    return report
+
+def resampleCorpus(filepath, scale, outputPath, seed=0, blockLines=100000):
+    """ Write a synthetic corpus with scale times as many lines as a corpus, drawn from its lines with replacement
+
+    Args:
+        filepath (str): filepath to the corpus text file
+        scale (float): number of lines written as a multiple of the lines of the corpus
+        outputPath (str): filepath to write the synthetic corpus to
+        seed (int): seed of the random line choices
+        blockLines (int): number of lines drawn and written at a time
+
+    Returns:
+        lineCount (int): number of lines written
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        lines = f.read().splitlines()
+    rng = random.Random(seed)
+    lineCount = int(round(len(lines) * scale))
+    with open(outputPath, 'w', encoding='utf-8', errors='surrogateescape') as f:
+        for start in range(0, lineCount, blockLines):
+            f.write('\n'.join(rng.choices(lines, k=min(blockLines, lineCount - start))) + '\n')
+    return lineCount
+
+def measureStage(function, items, traceMemory=True):
+    """ Run a stage, timing it, then run it again under tracemalloc to measure its peak memory
+
+    Args:
+        function (callable): runs the stage and returns its result, each call must start from the same state
+        items (int): number of lines the stage processes
+        traceMemory (bool): rerun the stage under tracemalloc, tracing slows it down so it is timed untraced
+
+    Returns:
+        result: result of the timed run
+        stats (dict): wall and CPU seconds, peak traced bytes and throughput of the stage
+    """
+    started = time.perf_counter()
+    cpuStarted = time.process_time()
+    result = function()
+    seconds = time.perf_counter() - started
+    stats = {'seconds': seconds, 'cpuSeconds': time.process_time() - cpuStarted, 'items': items,
+             'itemsPerSecond': items / seconds if seconds else None}
+    if traceMemory:
+        tracemalloc.start()
+        try:
+            function()
+            stats['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+def countCorpus(filepath, wordModel):
+    """ Count the unigrams and bigrams of a corpus file with a fresh engine.NgramCounter """
+    counter = NgramCounter(wordModel)
+    counter.update(CorpusReader(filepath))
+    return counter
+
+def goodTuringInputs(counter, threshold=0):
+    """ Given word counts, return the unigram and bigram frequencies and unknown bigram count wordLangId2 smooths """
+    unigramFreq, OOV = createOOV(counter.unigramFrequencies(), threshold)
+    if unigramFreq.get('<unk>', 0) == 0:
+        unigramFreq['<unk>'] = 0
+    bigramFreq = bigramFrequencies(counter.bigramCounts(Vocabulary(unigramFreq.keys()), dense=False))
+    if bigramFreq.get(('<unk>', '<unk>'), 0) == 0:
+        bigramFreq[('<unk>', '<unk>')] = 0
+    unkBigrams = len(unigramFreq) ** 2 - sum(1 for freq in bigramFreq.values() if freq > 0)
+    return unigramFreq, bigramFreq, unkBigrams
+
+def benchStages(corpora, testPath, scales, workDir, seed=0, traceMemory=True):
+    """ Time and memory profile every stage of training and prediction on corpora of increasing size
+
+    Args:
+        corpora (dict): a dictionary of language keys and training corpus path values
+        testPath (str): filepath to the test corpus
+        scales (list): corpus sizes as multiples of the given corpora, 1 uses them unchanged
+        workDir (str): directory the synthetic corpora and results are written to
+        seed (int): seed of the line resampling
+        traceMemory (bool): measure the peak traced memory of every stage
+
+    Returns:
+        results (list): a dictionary of corpus sizes and per stage measurements for each scale, a stage that fails
+            reports its error, predictLanguage scores with the add one word models
+    """
+    import letterLangId
+    import wordLangId
+    import wordLangId2
+    from wordLangId2 import goodTuringSmoothing
+
+    logger = logging.getLogger(__name__)
+    results = []
+    for scale in scales:
+        logger.info('Benchmarking stages on corpora scaled {0} times'.format(scale))
+        if scale == 1:
+            paths = dict(corpora)
+            scaledTestPath = testPath
+        else:
+            paths = {language: os.path.join(workDir, '{0}.x{1:g}'.format(os.path.basename(path), scale))
+                     for language, path in corpora.items()}
+            for i, (language, path) in enumerate(corpora.items()):
+                resampleCorpus(path, scale, paths[language], seed + i)
+            scaledTestPath = os.path.join(workDir, '{0}.x{1:g}'.format(os.path.basename(testPath), scale))
+            resampleCorpus(testPath, scale, scaledTestPath, seed + len(corpora))
+        trainLines = sum(len(lines) for lines in (readCorpus(path) for path in paths.values()))
+        testLines = readCorpus(scaledTestPath)
+
+        stages = {}
+        def measure(name, function, items):
+            # A stage that fails at this scale is reported with its error instead of ending the benchmark
+            try:
+                result, stages[name] = measureStage(function, items, traceMemory)
+                return result
+            except Exception as e:
+                logger.exception('Stage {0} failed at scale {1}'.format(name, scale))
+                stages[name] = {'error': '{0}: {1}'.format(type(e).__name__, e), 'items': items}
+
+        measure('readCorpus', lambda: {language: readCorpus(path) for language, path in paths.items()}, trainLines)
+        charCounters = measure('countCharacters', lambda: {language: countCorpus(path, False) for language, path in paths.items()}, trainLines)
+        measure('charModel', lambda: [letterLangId.charModel([], 30, language, counter=counter)
+                                      for language, counter in charCounters.items()], trainLines)
+        del charCounters
+        wordCounters = measure('countWords', lambda: {language: countCorpus(path, True) for language, path in paths.items()}, trainLines)
+        models = measure('wordModel', lambda: [wordLangId.wordModel([], 0, language, counter=counter)
+                                               for language, counter in wordCounters.items()], trainLines)
+        inputs = measure('goodTuringInputs', lambda: [goodTuringInputs(counter) for counter in wordCounters.values()], trainLines)
+        measure('goodTuringSmoothing', lambda: [goodTuringSmoothing(*languageInputs) for languageInputs in inputs], trainLines)
+        del inputs
+        measure('wordModelGT', lambda: [wordLangId2.wordModel([], 0, language, 'GT', counter=counter)
+                                        for language, counter in wordCounters.items()], trainLines)
+        del wordCounters
+        predictions = measure('predictLanguage', lambda: predictLanguage(testLines, models), len(testLines))
+        measure('writeResults', lambda: writeResults(predictions, os.path.join(workDir, 'results.out')), len(testLines))
+
+        for stage in stages.values():
+            if 'seconds' in stage:
+                stage['secondsPerItem'] = stage['seconds'] / stage['items']
+        results.append({'scale': scale, 'trainLines': trainLines, 'trainBytes': sum(os.path.getsize(path) for path in paths.values()),
+                        'testLines': len(testLines), 'stages': stages})
+        for path in set(paths.values()) - set(corpora.values()) | ({scaledTestPath} - {testPath}):
+            os.remove(path)
+
+    # Compare the time per line of every stage with the smallest scale to show where it stops scaling linearly
+    baseline = results[0]['stages']
+    for result in results:
+        for name, stage in result['stages'].items():
+            if 'secondsPerItem' in stage and 'secondsPerItem' in baseline[name]:
+                stage['slowdown'] = stage['secondsPerItem'] / baseline[name]['secondsPerItem']
+    return results
+
+def main(args):
+    lines = readCorpus(args.testPath)
+    solution = loadSolution(args.solutionPath)
+    report = {}
+    if 'earlyExit' in args.benchmarks:
+        scorer = loadScorer(args.modelPath)
+        documents, labels = longDocuments(lines, solution, args.docLines)
+        report['earlyExit'] = {'model': args.modelPath, 'languages': scorer.languages,
+                               'lines': benchEarlyExit(scorer, lines, solution, repeat=args.repeat),
+                               'documents': benchEarlyExit(scorer, documents, labels, repeat=args.repeat)}
+    if 'pruning' in args.benchmarks:
+        corpora = {language: CorpusReader(path, language=language) for language, path in languageCorpora(args).items()}
+        report['pruning'] = benchPruning(corpora, lines, solution)
+    if 'smoothing' in args.benchmarks:
+        corpora = {language: CorpusReader(path, language=language) for language, path in languageCorpora(args).items()}
+        report['smoothing'] = benchSmoothing(corpora, lines, solution, repeat=args.repeat)
+    if 'startup' in args.benchmarks:
+        report['startup'] = benchStartup(args.modelPath, args.startupText, args.repeat, args.startupTarget)
+    if 'stages' in args.benchmarks:
+        workDir = args.workDir or tempfile.mkdtemp(prefix='langIdBench')
+        try:
+            report['stages'] = benchStages(languageCorpora(args), args.testPath, sorted(args.scales), workDir,
+                                           args.seed, not args.noMemory)
+        finally:
+            if not args.workDir:
+                shutil.rmtree(workDir, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    if args.outputPath:
+        with open(args.outputPath, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if 'startup' in report and not report['startup']['withinTarget']:
+        logger = logging.getLogger(__name__)
+        logger.error('langId.py predict took {0:.0f} ms to its first prediction, over the {1:.0f} ms target'.format(
+            report['startup']['langIdPredict']['medianMs'], args.startupTarget))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    logger = logging.getLogger(__name__)
+
+    args = parser.parse_args()
+    main(args)
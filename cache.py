@@ -0,0 +1,151 @@
+"""
+Bounded cache of per-language line scores keyed on the cleaned line.
+
+Boilerplate lines, headers and short openers repeat often once they are cleaned, so their N x L score rows are kept
+and reused instead of being rescored. The cache evicts either the least recently used line or the oldest one.
+"""
+import logging
+from collections import OrderedDict
+import numpy as np
+
+POLICIES = ('lru', 'fifo')
+
+class PredictionCache:
+    """ Maps cleaned lines to their row of per-language log probabilities
+
+    A cache holds scores from one scoring configuration, so a scorer or early exit margins that change need a new
+    cache.
+
+    Args:
+        maxSize (int): largest number of lines kept
+        policy (str): lru evicts the least recently used line, fifo evicts the line cached first
+    """
+    def __init__(self, maxSize=100000, policy='lru'):
+        if policy not in POLICIES:
+            raise ValueError('Unknown cache policy {0}, expected one of {1}'.format(policy, ', '.join(POLICIES)))
+        if maxSize < 1:
+            raise ValueError('Cache size must be at least 1')
+        self.maxSize = maxSize
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Lines held by copies of the cache in other processes, see mergeStats
+        self.copiedSize = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, line):
+        return line in self.entries
+
+    def get(self, line):
+        """ Return the cached scores of a line, or None if it is not cached """
+        row = self.entries.get(line)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(line)
+        return row
+
+    def put(self, line, row):
+        """ Cache the scores of a line, evicting a line if the cache is full """
+        if line in self.entries:
+            self.entries[line] = row
+            if self.policy == 'lru':
+                self.entries.move_to_end(line)
+            return
+        if len(self.entries) >= self.maxSize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.entries[line] = row
+
+    def lookup(self, lines):
+        """ Given a batch of cleaned lines, return the cached rows and the distinct lines that still need scoring
+
+        A line repeated within the batch is scored once, so its repeats count as hits.
+
+        Args:
+            lines (list): cleaned lines
+
+        Returns:
+            rows (list): cached scores of each line, None for lines that still need scoring
+            missing (list): distinct lines that still need scoring, in order of first appearance
+        """
+        rows = []
+        missing = {}
+        for line in lines:
+            if line in missing:
+                self.hits += 1
+                rows.append(None)
+            else:
+                row = self.get(line)
+                if row is None:
+                    missing[line] = None
+                rows.append(row)
+        return rows, list(missing)
+
+    def fill(self, lines, rows, missing, scores):
+        """ Cache the scores of the missing lines and return the scores of the whole batch
+
+        Args:
+            lines (list): cleaned lines passed to lookup
+            rows (list): rows returned by lookup
+            missing (list): lines returned by lookup
+            scores (np.ndarray): len(missing) x L matrix of log probabilities of the missing lines
+
+        Returns:
+            scores (np.ndarray): N x L matrix of log probabilities of the lines
+        """
+        # Copy each row so a cached row does not keep its whole batch's score matrix alive
+        scored = {line: row.copy() for line, row in zip(missing, scores)}
+        for line, row in scored.items():
+            self.put(line, row)
+        return np.array([scored[line] if row is None else row for line, row in zip(lines, rows)])
+
+    def score(self, lines, scoreLines):
+        """ Given a batch of cleaned lines, return their scores, scoring only the lines that are not cached
+
+        Args:
+            lines (list): cleaned lines
+            scoreLines (callable): returns the N x L matrix of log probabilities of a list of lines
+
+        Returns:
+            scores (np.ndarray): N x L matrix of log probabilities of the lines
+        """
+        if not lines:
+            return scoreLines(lines)
+        rows, missing = self.lookup(lines)
+        if not missing:
+            return np.array(rows)
+        return self.fill(lines, rows, missing, scoreLines(missing))
+
+    def mergeStats(self, hits, misses, evictions, size):
+        """ Add the counters of copies of the cache used by other processes, such as the workers of parallel.predictParallel
+
+        Args:
+            hits (int): lookups the copies answered
+            misses (int): lookups the copies could not answer
+            evictions (int): lines the copies evicted
+            size (int): lines held by the copies
+        """
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+        self.copiedSize += size
+
+    def stats(self):
+        """ Return the size and hit, miss and eviction counts of the cache as a dictionary """
+        lookups = self.hits + self.misses
+        return {'policy': self.policy, 'size': len(self.entries) + self.copiedSize, 'maxSize': self.maxSize, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'hitRate': self.hits / lookups if lookups else None}
+
+    def logStats(self):
+        """ Log the cache statistics """
+        logger = logging.getLogger(__name__)
+        stats = self.stats()
+        logger.info('Prediction cache: {0} hits, {1} misses, {2} evictions, {3}/{4} lines cached'.format(
+            stats['hits'], stats['misses'], stats['evictions'], stats['size'], stats['maxSize']))
@@ -0,0 +1,174 @@
+"""
+Command line options and commands shared by letterLangId.py, wordLangId.py and wordLangId2.py.
+
+Every script creates its parser with createParser, adds the options of its own models and passes a function building
+its scorer from the corpora to main, which runs the run, train, update, predict and stream commands the same way for
+every model type. langId.py train builds its models through train with the builder of the model type's script.
+"""
+import argparse
+from engine import NgramCounter, pruneModel
+from helper import CorpusReader, loadSolution, predictBatches, evaluate, writeResults, streamPredictions
+from scoring import BatchScorer
+from parallel import countCorpora, buildModels
+from registry import languageCorpora
+from modelStore import saveScorer, loadScorer, saveCounters, loadCounters
+from cache import PredictionCache, POLICIES
+import instrumentation
+
+COMMANDS = ['run', 'train', 'update', 'predict', 'stream']
+
+def createParser(description, scriptName, unkThreshold):
+    """ Return an argument parser holding the options shared by every model type
+
+    Args:
+        description (str): description of the script
+        scriptName (str): name of the script, the default output and model files are named after it
+        unkThreshold (int): default frequency threshold to be included in the vocabulary
+
+    Returns:
+        parser (argparse.ArgumentParser): parser the script adds the options of its models to
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('command', nargs='?', default='run', choices=COMMANDS, help='run trains and predicts, train saves the models to --modelPath, update folds the corpora into the counts in --countsPath and saves the refreshed models, predict loads the models from --modelPath, stream loads them and writes each prediction as soon as it is made')
+    parser.add_argument('--englishPath', default='LangId.train.English', help='Input path for English corpus')
+    parser.add_argument('--frenchPath', default='LangId.train.French', help='Input path for French corpus')
+    parser.add_argument('--italianPath', default='LangId.train.Italian', help='Input path for Italian corpus')
+    parser.add_argument('--trainDir', default=None, help='Directory of LangId.train.<Language> corpora, one per language to identify')
+    parser.add_argument('--manifest', default=None, help='File listing a language and its training corpus path on each line')
+    parser.add_argument('--testPath', default='LangId.test', help='Input path for test corpus, - reads stdin when streaming')
+    parser.add_argument('--solutionPath', default='LangId.sol', help='Input path for solution')
+    parser.add_argument('--outputPath', default=scriptName + '.out', help='Output path for predictions, - writes stdout when streaming')
+    parser.add_argument('--modelPath', default=scriptName + '.model', help='Path of the binary model file written by train and read by predict')
+    parser.add_argument('--countsPath', default=None, help='Path of the raw counts file saved by train and update and read by update')
+    parser.add_argument('--chunkSize', default=1 << 20, type=int, help='Number of characters read from a corpus at a time')
+    parser.add_argument('--workers', default=1, type=int, help='Number of processes used to count the corpora, build the models and score the test corpus')
+    parser.add_argument('--pruneMargin', default=None, type=float, help='Stop scoring a language once its log probability is this far behind the leader')
+    parser.add_argument('--decisiveMargin', default=None, type=float, help='Stop scoring a line once its leading language is this far ahead of the others')
+    parser.add_argument('--cacheSize', default=0, type=int, help='Number of cleaned lines whose scores are cached for repeated lines, 0 disables the cache')
+    parser.add_argument('--cachePolicy', default='lru', choices=POLICIES, help='Eviction policy of the prediction cache')
+    parser.add_argument('--withScores', action='store_true', help='Also write the log probability of every language when streaming, and with early exit the n-grams scored and the final margin')
+    parser.add_argument('--unkThreshold', default=unkThreshold, help='Frequency threshold to be included in vocabulary')
+    instrumentation.addArguments(parser)
+    return parser
+
+def addCompressionArguments(parser):
+    """ Add the options shrinking word models to fit a memory budget, applied by bigramScorer """
+    parser.add_argument('--minCount', default=1, type=int, help='Prune the bigrams seen fewer times than this')
+    parser.add_argument('--topK', default=None, type=int, help='Keep only the K most frequent bigrams of each language')
+    parser.add_argument('--entropyThreshold', default=None, type=float, help='Prune the bigrams whose frequency weighted log probability gain over the unknown bigram is below this')
+    parser.add_argument('--quantizeBits', default=None, type=int, choices=[8, 16], help='Store the bigram log probabilities as 8 or 16 bit codes')
+
+def createCache(args):
+    """ Return the prediction cache requested by the options, None when --cacheSize is 0 """
+    return PredictionCache(args.cacheSize, args.cachePolicy) if args.cacheSize > 0 else None
+
+def buildLanguageModels(builder, arguments, workers):
+    """ Build the model of every language, one language per worker process when there are several
+
+    Args:
+        builder (function): module level function building one language's model from its arguments
+        arguments (list): a dictionary of the builder's keyword arguments for each language
+        workers (int): number of processes
+
+    Returns:
+        models (list): model built from each language's arguments, in the order of the arguments
+    """
+    if workers > 1:
+        return buildModels(builder, arguments, workers)
+    return [builder(**kwargs) for kwargs in arguments]
+
+def bigramScorer(args, corpora, builder, wordModel):
+    """ Count the corpora, build a bigram model for every language and return their scorer
+
+    The corpora are folded into the counts loaded from --countsPath when updating, and counted across worker
+    processes when there are several, so the builders then only map the merged counts. Word models are pruned and
+    quantized as requested by the options of addCompressionArguments.
+
+    Args:
+        args (argparse.Namespace): parsed options of the script
+        corpora (dict): a dictionary of language keys and helper.CorpusReader values
+        builder (function): module level function called with the keyword arguments corpus, threshold (the
+            --unkThreshold), language and counter (its engine.NgramCounter), returning the language's model
+        wordModel (bool): true if the models are word models and false if they are character models
+
+    Returns:
+        scorer (scoring.BatchScorer): scorer of the languages
+        counters (dict): a dictionary of language keys and engine.NgramCounter values
+    """
+    # Load the counts the corpora are folded into when updating existing models
+    counters = loadCounters(args.countsPath) if args.command == 'update' else {}
+    for language in corpora:
+        counters.setdefault(language, NgramCounter(wordModel=wordModel))
+    # Count the corpora across worker processes, the model builders then only map the merged counts
+    if args.workers > 1:
+        countCorpora(corpora, counters, args.workers)
+        corpora = {}
+
+    models = buildLanguageModels(builder, [dict(corpus=corpora.get(language, []), threshold=args.unkThreshold,
+                                                language=language, counter=counter)
+                                           for language, counter in counters.items()], args.workers)
+    if not wordModel:
+        return BatchScorer(models), counters
+    # Prune the bigrams that matter least, a pruned bigram scores like an unseen one
+    if args.minCount > 1 or args.topK is not None or args.entropyThreshold is not None:
+        models = [pruneModel(model, counters[model.language].bigramCounts(model.vocab, dense=False), args.minCount,
+                             args.topK, args.entropyThreshold) for model in models]
+    scorer = BatchScorer(models)
+    if args.quantizeBits:
+        scorer.quantize(args.quantizeBits)
+    return scorer, counters
+
+def train(args, buildScorer):
+    """ Read the training corpus of every registered language and build the scorer, saving it for train and update
+
+    Args:
+        args (argparse.Namespace): parsed options of a script
+        buildScorer (function): called with the options and a dictionary of language keys and helper.CorpusReader
+            values, returns the scorer and the counts saved to --countsPath, None if the models keep no counts
+
+    Returns:
+        scorer (scoring.BatchScorer): scorer of the languages
+    """
+    corpora = {language: CorpusReader(path, args.chunkSize, language=language)
+               for language, path in languageCorpora(args).items()}
+    scorer, counters = buildScorer(args, corpora)
+    if args.command in ('train', 'update'):
+        saveScorer(scorer, args.modelPath)
+        if args.countsPath:
+            saveCounters(counters, args.countsPath)
+    return scorer
+
+def main(args, parser, buildScorer):
+    """ Run the command of a script's options with the scorer its models build
+
+    Args:
+        args (argparse.Namespace): parsed options of the script
+        parser (argparse.ArgumentParser): parser of the script, which reports invalid options
+        buildScorer (function): builds the script's scorer from the corpora, see train
+    """
+    if args.command == 'update' and not args.countsPath:
+        parser.error('update requires --countsPath')
+    if args.command in ('predict', 'stream'):
+        # Load the trained models
+        scorer = loadScorer(args.modelPath)
+    else:
+        scorer = train(args, buildScorer)
+        if args.command in ('train', 'update'):
+            return
+
+    if args.command == 'stream':
+        # Classify --testPath, - for stdin, as it is read, lines from stdin have no solution to evaluate against
+        streamPredictions(args.testPath, args.outputPath, scorer, pruneMargin=args.pruneMargin, decisiveMargin=args.decisiveMargin,
+                          cache=createCache(args), withScores=args.withScores,
+                          solutionPath=args.solutionPath if args.testPath != '-' else None)
+        return
+
+    # Load test corpus and solution
+    testCorpus = CorpusReader(args.testPath, args.chunkSize)
+    solution = loadSolution(args.solutionPath)
+
+    # Predict language, caching the scores of repeated lines
+    results = predictBatches(testCorpus, scorer, workers=args.workers,
+                             pruneMargin=args.pruneMargin, decisiveMargin=args.decisiveMargin, cache=createCache(args))
+    evaluate(results, solution)
+    writeResults(results, args.outputPath)
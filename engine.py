@@ -0,0 +1,728 @@
+"""
+Shared training engine for the character and word language models.
+
+Tokens are interned to integer ids through a Vocabulary so that mapping a token to itself or to <unk> is a
+single dictionary lookup, and bigram counts are kept in NumPy arrays instead of tuple keyed dictionaries. Higher
+order n-grams are counted in fixed size tables indexed by a hash of their token ids.
+"""
+import math
+import logging
+import numpy as np
+
+UNK = '<unk>'
+
+def tokenize(line, wordModel, order=2):
+    """ Given a cleaned line, return its tokens with the <start> and <end> tokens added
+
+    Args:
+        line (str): cleaned line from a corpus
+        wordModel (bool): split the line into words if true and into characters otherwise
+        order (int): n-gram order, the line is padded with order - 1 <start> tokens so its first token has a full context
+
+    Returns:
+        tokens (list): list of characters/words from the line
+    """
+    if wordModel:
+        return ('<start> ' * (order - 1) + line + ' <end>').split()
+    return ['<start>'] * (order - 1) + list(line) + ['<end>']
+
+class Vocabulary:
+    """ Maps tokens to integer ids, sending every token outside of the vocabulary to the id of <unk>
+
+    Args:
+        tokens (iterable): tokens in the vocabulary, <unk> is appended if it is not already included
+    """
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+        if UNK not in self.tokens:
+            self.tokens.append(UNK)
+        self.index = {token: i for i, token in enumerate(self.tokens)}
+        self.unkId = self.index[UNK]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.index
+
+    def lookup(self, token):
+        """ Return the id of a token or the id of <unk> if it is out of vocabulary """
+        return self.index.get(token, self.unkId)
+
+    def encode(self, line):
+        """ Given a list of tokens, return an array of their ids
+
+        Args:
+            line (list): list of characters/words from a line in a corpus
+
+        Returns:
+            ids (np.ndarray): int64 array of token ids
+        """
+        index = self.index
+        unkId = self.unkId
+        return np.fromiter((index.get(token, unkId) for token in line), dtype=np.int64, count=len(line))
+
+class DenseBigramCounts:
+    """ Bigram counts stored as a dense V x V matrix, suited to small vocabularies such as characters
+
+    Args:
+        vocab (Vocabulary): vocabulary the ids refer to
+        counts (np.ndarray): V x V matrix of bigram frequencies
+    """
+    def __init__(self, vocab, counts):
+        self.vocab = vocab
+        self.counts = counts
+
+    def get(self, id1, id2):
+        return int(self.counts[id1, id2])
+
+    def frequencies(self, ids1, ids2):
+        """ Return the frequency of each bigram given the ids of its tokens """
+        return self.counts[ids1, ids2]
+
+    def nonzero(self):
+        """ Return the ids and frequencies of all seen bigrams
+
+        Returns:
+            ids1 (np.ndarray): ids of the first token of each bigram
+            ids2 (np.ndarray): ids of the second token of each bigram
+            freqs (np.ndarray): frequency of each bigram
+        """
+        ids1, ids2 = np.nonzero(self.counts)
+        return ids1, ids2, self.counts[ids1, ids2]
+
+class SparseBigramCounts:
+    """ Bigram counts stored as a sorted table of flattened bigram ids (id1 * V + id2), suited to word vocabularies
+
+    The position of the first occurrence of each bigram is kept so the bigrams can be listed in corpus order.
+
+    Args:
+        vocab (Vocabulary): vocabulary the ids refer to
+        keys (np.ndarray): sorted flattened bigram ids
+        freqs (np.ndarray): frequency of each bigram in keys
+        firstSeen (np.ndarray): position in the corpus of the first occurrence of each bigram in keys
+    """
+    def __init__(self, vocab, keys, freqs, firstSeen):
+        self.vocab = vocab
+        self.keys = keys
+        self.freqs = freqs
+        self.firstSeen = firstSeen
+
+    def get(self, id1, id2):
+        key = id1 * len(self.vocab) + id2
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.freqs[i])
+        return 0
+
+    def frequencies(self, ids1, ids2):
+        """ Return the frequency of each bigram given the ids of its tokens """
+        if len(self.keys) == 0:
+            return np.zeros(len(ids1), dtype=np.int64)
+        keys = np.asarray(ids1) * len(self.vocab) + np.asarray(ids2)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.freqs[positions], 0)
+
+    def nonzero(self):
+        """ Return the ids and frequencies of all seen bigrams in the order they first occur in the corpus
+
+        Returns:
+            ids1 (np.ndarray): ids of the first token of each bigram
+            ids2 (np.ndarray): ids of the second token of each bigram
+            freqs (np.ndarray): frequency of each bigram
+        """
+        seen = np.nonzero(self.freqs > 0)[0]
+        seen = seen[np.argsort(self.firstSeen[seen], kind='stable')]
+        ids1, ids2 = np.divmod(self.keys[seen], len(self.vocab))
+        return ids1, ids2, self.freqs[seen]
+
+def mergeSparseCounts(keys, freqs, firstSeen):
+    """ Given possibly repeated flattened bigram ids, return the sorted unique ids with summed frequencies and earliest positions
+
+    Args:
+        keys (np.ndarray): flattened bigram ids
+        freqs (np.ndarray): frequency of each id in keys
+        firstSeen (np.ndarray): first position of each id in keys
+
+    Returns:
+        keys (np.ndarray): sorted unique flattened bigram ids
+        freqs (np.ndarray): summed frequency of each id
+        firstSeen (np.ndarray): earliest position of each id
+    """
+    keys, inverse = np.unique(keys, return_inverse=True)
+    mergedFreqs = np.zeros(len(keys), dtype=np.int64)
+    np.add.at(mergedFreqs, inverse, freqs)
+    mergedFirstSeen = np.full(len(keys), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(mergedFirstSeen, inverse, firstSeen)
+    return keys, mergedFreqs, mergedFirstSeen
+
+def mergeSortedCounts(keys, freqs, firstSeen, newKeys, newFreqs, newFirstSeen):
+    """ Given two tables of sorted unique flattened bigram ids, return their union with summed frequencies and earliest positions
+
+    The new ids are located in the existing table with a binary search, so the existing table is copied once
+    instead of being sorted again.
+
+    Args:
+        keys (np.ndarray): sorted unique flattened bigram ids
+        freqs (np.ndarray): frequency of each id in keys
+        firstSeen (np.ndarray): first position of each id in keys
+        newKeys (np.ndarray): sorted unique flattened bigram ids to add
+        newFreqs (np.ndarray): frequency of each id in newKeys
+        newFirstSeen (np.ndarray): first position of each id in newKeys
+
+    Returns:
+        keys (np.ndarray): sorted unique flattened bigram ids of both tables
+        freqs (np.ndarray): summed frequency of each id
+        firstSeen (np.ndarray): earliest position of each id
+    """
+    positions = np.searchsorted(keys, newKeys)
+    found = np.zeros(len(newKeys), dtype=bool)
+    inside = positions < len(keys)
+    found[inside] = keys[positions[inside]] == newKeys[inside]
+    freqs = freqs.copy()
+    firstSeen = firstSeen.copy()
+    freqs[positions[found]] += newFreqs[found]
+    firstSeen[positions[found]] = np.minimum(firstSeen[positions[found]], newFirstSeen[found])
+    # Ids inserted at the same position keep their sorted order
+    added = positions[~found]
+    return (np.insert(keys, added, newKeys[~found]), np.insert(freqs, added, newFreqs[~found]),
+            np.insert(firstSeen, added, newFirstSeen[~found]))
+
+class NgramCounter:
+    """ Counts the unigrams and bigrams of a corpus in a single pass and can fold in more text at any time
+
+    Raw tokens are interned to ids in the order they are first seen, unigram counts are kept in an array indexed by
+    those ids and bigram counts in a sorted table of flattened raw id pairs (id1 << 32 | id2) with the position of
+    their first occurrence. The vocabulary threshold is only applied when the counts are mapped onto a Vocabulary,
+    so updating the counter never requires recounting the text already seen.
+
+    Args:
+        wordModel (bool): count words if true and characters otherwise
+        batchSize (int): number of bigrams buffered before they are folded into the counts
+    """
+    def __init__(self, wordModel, batchSize=1 << 20):
+        self.wordModel = wordModel
+        self.batchSize = batchSize
+        self.index = {}
+        self.unigrams = np.zeros(0, dtype=np.int64)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.freqs = np.empty(0, dtype=np.int64)
+        self.firstSeen = np.empty(0, dtype=np.int64)
+        self.position = 0
+
+    @property
+    def tokens(self):
+        """ Raw tokens in the order they were first seen """
+        return list(self.index)
+
+    def update(self, corpus):
+        """ Fold the unigrams and bigrams of more lines into the counts
+
+        Args:
+            corpus (iterable): cleaned lines from a language corpus
+        """
+        index = self.index
+        setdefault = index.setdefault
+        buffer = []
+        buffered = 0
+        for line in corpus:
+            ids = [setdefault(token, len(index)) for token in tokenize(line, self.wordModel)]
+            buffer.append(ids)
+            buffered += len(ids)
+            if buffered >= self.batchSize:
+                self._flush(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            self._flush(buffer)
+
+    def _flush(self, lines):
+        lengths = np.fromiter((len(ids) for ids in lines), dtype=np.int64, count=len(lines))
+        ids = np.fromiter((i for ids in lines for i in ids), dtype=np.int64, count=int(lengths.sum()))
+        unigrams = np.bincount(ids, minlength=len(self.index))
+        unigrams[:len(self.unigrams)] += self.unigrams
+        self.unigrams = unigrams
+
+        # Pair every token with the next one, dropping the pairs that span two lines
+        lineEnds = np.cumsum(lengths)[lengths > 0] - 1
+        valid = np.ones(max(len(ids) - 1, 0), dtype=bool)
+        valid[lineEnds[:-1]] = False
+        batch = (ids[:-1] << 32 | ids[1:])[valid]
+        positions = np.nonzero(valid)[0] + self.position
+
+        batchKeys, first, batchFreqs = np.unique(batch, return_index=True, return_counts=True)
+        self.keys, self.freqs, self.firstSeen = mergeSortedCounts(self.keys, self.freqs, self.firstSeen,
+                                                                  batchKeys, batchFreqs, positions[first])
+        self.position += len(ids)
+
+    def merge(self, others):
+        """ Fold the counts of other counters, such as ones that counted later parts of the corpus, into this one
+
+        Args:
+            others (list): NgramCounter objects to add, in corpus order after the text already counted
+        """
+        remaps = [np.array([self.index.setdefault(token, len(self.index)) for token in other.index], dtype=np.int64)
+                  for other in others]
+        unigrams = np.zeros(len(self.index), dtype=np.int64)
+        unigrams[:len(self.unigrams)] += self.unigrams
+        keys = []
+        freqs = []
+        firstSeen = []
+        for remap, other in zip(remaps, others):
+            np.add.at(unigrams, remap, other.unigrams)
+            keys.append(remap[other.keys >> 32] << 32 | remap[other.keys & 0xFFFFFFFF])
+            freqs.append(other.freqs)
+            firstSeen.append(other.firstSeen + self.position)
+            self.position += other.position
+        self.unigrams = unigrams
+        if not others:
+            return
+        # Sort the other counts among themselves, then fold them into the sorted table in one pass
+        otherKeys, otherFreqs, otherFirstSeen = mergeSparseCounts(np.concatenate(keys), np.concatenate(freqs),
+                                                                  np.concatenate(firstSeen))
+        self.keys, self.freqs, self.firstSeen = mergeSortedCounts(self.keys, self.freqs, self.firstSeen,
+                                                                  otherKeys, otherFreqs, otherFirstSeen)
+
+    def unigramFrequencies(self):
+        """ Return a dictionary of unigram keys and frequency values in the order the unigrams were first seen """
+        return dict(zip(self.index, self.unigrams.tolist()))
+
+    def bigramCounts(self, vocab, dense):
+        """ Map the raw bigram counts onto a vocabulary, merging the bigrams of out of vocabulary tokens into <unk>
+
+        Args:
+            vocab (Vocabulary): vocabulary used to map tokens to ids
+            dense (bool): return a DenseBigramCounts if true and a SparseBigramCounts otherwise
+
+        Returns:
+            counts (DenseBigramCounts or SparseBigramCounts): bigram frequencies
+        """
+        logger = logging.getLogger(__name__)
+        V = len(vocab)
+        remap = np.array([vocab.lookup(token) for token in self.index], dtype=np.int64)
+        keys = remap[self.keys >> 32] * V + remap[self.keys & 0xFFFFFFFF]
+        if dense:
+            flat = np.zeros(V * V, dtype=np.int64)
+            np.add.at(flat, keys, self.freqs)
+            counts = DenseBigramCounts(vocab, flat.reshape(V, V))
+        else:
+            counts = SparseBigramCounts(vocab, *mergeSparseCounts(keys, self.freqs, self.firstSeen))
+        logger.info('Counted {0} distinct bigrams'.format(len(counts.nonzero()[2])))
+        return counts
+
+def logArray(probs):
+    """ Return the natural log of every probability, computed with math.log so the values match helper.calcLangProbs """
+    return np.array([math.log(p) for p in np.asarray(probs).tolist()], dtype=np.float64)
+
+class BigramModel:
+    """ A bigram language model storing log probabilities with the unseen bigram fallback already resolved
+
+    Every bigram a model has not seen, including those with out of vocabulary tokens, scores the log probability of
+    (<unk>, <unk>), or with backoff arrays backoffLogProbs[id1] + continuationLogProbs[id2]. Dense models store the
+    resolved V x V table, sparse models store the log probabilities of the seen bigrams against sorted flattened
+    bigram ids (id1 * V + id2) and fall back to the unseen log probability for any other key.
+
+    Args:
+        language (str): name of the language
+        vocab (Vocabulary): vocabulary of the language
+        ids1 (np.ndarray): ids of the first token of each seen bigram
+        ids2 (np.ndarray): ids of the second token of each seen bigram
+        probs (np.ndarray): probability of each seen bigram
+        unkProb (float): probability of (<unk>, <unk>), used for every unseen bigram
+        dense (bool): store the model as a dense V x V table if true and as a sorted table otherwise
+        wordModel (bool): true if the model is a word model and false if it is a character model
+        backoffLogProbs (np.ndarray): log backoff weight of each first token of an unseen bigram, None for no backoff
+        continuationLogProbs (np.ndarray): log probability of each second token of an unseen bigram, None for no backoff
+    """
+    def __init__(self, language, vocab, ids1, ids2, probs, unkProb, dense, wordModel, backoffLogProbs=None,
+                 continuationLogProbs=None):
+        self.language = language
+        self.vocab = vocab
+        self.dense = dense
+        self.wordModel = wordModel
+        self.unkLogProb = math.log(unkProb)
+        self.backoffLogProbs = backoffLogProbs
+        self.continuationLogProbs = continuationLogProbs
+        self._store(ids1, ids2, logArray(probs))
+
+    def _store(self, ids1, ids2, logProbs):
+        V = len(self.vocab)
+        keys = np.asarray(ids1, dtype=np.int64) * V + np.asarray(ids2, dtype=np.int64)
+        if self.dense:
+            if self.backoffLogProbs is None:
+                self.table = np.full(V * V, self.unkLogProb)
+            else:
+                self.table = (self.backoffLogProbs[:, None] + self.continuationLogProbs[None, :]).reshape(-1)
+            self.table[keys] = logProbs
+            self.table = self.table.reshape(V, V)
+            self.keys = None
+            self.logProbs = None
+        else:
+            order = np.argsort(keys, kind='stable')
+            self.table = None
+            self.keys = keys[order]
+            self.logProbs = logProbs[order]
+
+    @classmethod
+    def fromLogProbabilities(cls, language, vocab, ids1, ids2, logProbs, unkLogProb, dense, wordModel,
+                             backoffLogProbs=None, continuationLogProbs=None):
+        """ Build a model from the log probabilities of its seen bigrams, such as those of another model
+
+        Args:
+            language (str): name of the language
+            vocab (Vocabulary): vocabulary of the language
+            ids1 (np.ndarray): ids of the first token of each seen bigram
+            ids2 (np.ndarray): ids of the second token of each seen bigram
+            logProbs (np.ndarray): log probability of each seen bigram
+            unkLogProb (float): log probability used for every unseen bigram without backoff arrays
+            dense (bool): store the model as a dense V x V table if true and as a sorted table otherwise
+            wordModel (bool): true if the model is a word model and false if it is a character model
+            backoffLogProbs (np.ndarray): log backoff weight of each first token of an unseen bigram, None for no backoff
+            continuationLogProbs (np.ndarray): log probability of each second token of an unseen bigram, None for no backoff
+
+        Returns:
+            model (BigramModel): the language model
+        """
+        model = cls.__new__(cls)
+        model.language = language
+        model.vocab = vocab
+        model.dense = dense
+        model.wordModel = wordModel
+        model.unkLogProb = unkLogProb
+        model.backoffLogProbs = backoffLogProbs
+        model.continuationLogProbs = continuationLogProbs
+        model._store(ids1, ids2, np.asarray(logProbs, dtype=np.float64))
+        return model
+
+    @classmethod
+    def fromProbabilities(cls, language, vocab, mle, dense, wordModel):
+        """ Build a model from a dictionary of bigram keys and probability values that includes (<unk>, <unk>)
+
+        Args:
+            language (str): name of the language
+            vocab (Vocabulary): vocabulary of the language
+            mle (dict): a dictionary of bigram keys and probability values for all seen bigrams
+            dense (bool): store the model as a dense V x V table if true and as a sorted table otherwise
+            wordModel (bool): true if the model is a word model and false if it is a character model
+
+        Returns:
+            model (BigramModel): the language model
+        """
+        ids1 = np.array([vocab.lookup(bigram[0]) for bigram in mle.keys()], dtype=np.int64)
+        ids2 = np.array([vocab.lookup(bigram[1]) for bigram in mle.keys()], dtype=np.int64)
+        probs = np.array(list(mle.values()), dtype=np.float64)
+        return cls(language, vocab, ids1, ids2, probs, mle[(UNK, UNK)], dense, wordModel)
+
+    def seenBigrams(self):
+        """ Return the ids and log probabilities of the bigrams stored in the model
+
+        Returns:
+            ids1 (np.ndarray): ids of the first token of each bigram
+            ids2 (np.ndarray): ids of the second token of each bigram
+            logProbs (np.ndarray): log probability of each bigram
+        """
+        V = len(self.vocab)
+        if self.dense:
+            ids = np.arange(V)
+            ids1, ids2 = np.nonzero(self.table != self.unseenLogProbs(ids[:, None], ids[None, :]))
+            return ids1, ids2, self.table[ids1, ids2]
+        ids1, ids2 = np.divmod(self.keys, V)
+        return ids1, ids2, self.logProbs
+
+    def unseenLogProbs(self, ids1, ids2):
+        """ Given the ids of the tokens of B bigrams, return the log probability each would score if it were unseen
+
+        Args:
+            ids1 (np.ndarray): ids of the first token of each bigram
+            ids2 (np.ndarray): ids of the second token of each bigram
+
+        Returns:
+            logProbs (np.ndarray): unseen bigram log probability of each bigram
+        """
+        if self.backoffLogProbs is None:
+            return np.full(np.broadcast(ids1, ids2).shape, self.unkLogProb)
+        return self.backoffLogProbs[ids1] + self.continuationLogProbs[ids2]
+
+    def bigramLogProbs(self, ids1, ids2):
+        """ Given the ids of the tokens of B bigrams, return the log probability of each bigram
+
+        Args:
+            ids1 (np.ndarray): ids of the first token of each bigram
+            ids2 (np.ndarray): ids of the second token of each bigram
+
+        Returns:
+            logProbs (np.ndarray): log probability of each bigram
+        """
+        if self.dense:
+            return self.table[ids1, ids2]
+        if len(self.keys) == 0:
+            return self.unseenLogProbs(ids1, ids2)
+        keys = ids1 * len(self.vocab) + ids2
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.logProbs[positions], self.unseenLogProbs(ids1, ids2))
+
+def addOneModel(unigramFreq, counts, language, wordModel):
+    """ Given unigram frequencies and bigram counts, return a model with add one smoothed probabilities
+
+    Args:
+        unigramFreq (dict): a dictionary of unigram keys and frequency values, keyed by every token in the vocabulary
+        counts (DenseBigramCounts or SparseBigramCounts): bigram frequencies
+        language (str): name of the language
+        wordModel (bool): true if the model is a word model and false if it is a character model
+
+    Returns:
+        model (BigramModel): the add one smoothed language model
+    """
+    vocab = counts.vocab
+    unigrams = np.array([unigramFreq[token] for token in vocab.tokens], dtype=np.int64)
+    ids1, ids2, freqs = counts.nonzero()
+    probs = (freqs + 1) / (unigrams[ids1] + len(vocab))
+    unkProb = (counts.get(vocab.unkId, vocab.unkId) + 1) / (unigramFreq[UNK] + len(vocab))
+    return BigramModel(language, vocab, ids1, ids2, probs, unkProb, isinstance(counts, DenseBigramCounts), wordModel)
+
+def kneserNeyModel(counts, language, wordModel, discount=None):
+    """ Given bigram counts, return a model with interpolated Kneser-Ney smoothed probabilities
+
+    P(b | a) = max(c(a, b) - D, 0) / c(a) + lambda(a) * Pcont(b), where lambda(a) = D * N1+(a .) / c(a) is the mass
+    discounted from the bigrams starting with a and Pcont(b) = (N1+(. b) + 1) / (N1+(. .) + V) is the add one
+    smoothed share of distinct bigram types ending with b. Seen bigrams store the interpolated probability and unseen
+    ones score log lambda(a) + log Pcont(b) from the backoff and continuation arrays, both precomputed here. A token
+    never seen as a first token backs off to Pcont alone.
+
+    Args:
+        counts (DenseBigramCounts or SparseBigramCounts): bigram frequencies
+        language (str): name of the language
+        wordModel (bool): true if the model is a word model and false if it is a character model
+        discount (float): absolute discount D between 0 and 1, None estimates it as n1 / (n1 + 2 * n2) from the
+            numbers of bigrams seen once and twice, or uses 0.5 if either number is 0
+
+    Returns:
+        model (BigramModel): the Kneser-Ney smoothed language model
+    """
+    logger = logging.getLogger(__name__)
+    vocab = counts.vocab
+    V = len(vocab)
+    ids1, ids2, freqs = counts.nonzero()
+    if discount is None:
+        n1 = int(np.count_nonzero(freqs == 1))
+        n2 = int(np.count_nonzero(freqs == 2))
+        # The estimate is 1 without bigrams seen twice, as in small corpora, so fall back to a moderate discount
+        discount = n1 / (n1 + 2 * n2) if n1 and n2 else 0.5
+    if not 0 < discount < 1:
+        raise ValueError('Kneser-Ney discount must be between 0 and 1')
+    logger.info('{0} Kneser-Ney discount is {1:.3f}'.format(language, discount))
+
+    contextCounts = np.bincount(ids1, weights=freqs, minlength=V)
+    followers = np.bincount(ids1, minlength=V)
+    continuations = np.bincount(ids2, minlength=V)
+    continuationProbs = (continuations + 1) / (len(freqs) + V)
+    seen = contextCounts > 0
+    backoffs = np.ones(V)
+    backoffs[seen] = discount * followers[seen] / contextCounts[seen]
+
+    probs = (freqs - discount) / contextCounts[ids1] + backoffs[ids1] * continuationProbs[ids2]
+    backoffLogProbs = np.log(backoffs)
+    continuationLogProbs = np.log(continuationProbs)
+    unkId = vocab.unkId
+    unkCount = counts.get(unkId, unkId)
+    unkProb = (max(unkCount - discount, 0) / contextCounts[unkId] if seen[unkId] else 0) + backoffs[unkId] * continuationProbs[unkId]
+    return BigramModel(language, vocab, ids1, ids2, probs, unkProb, isinstance(counts, DenseBigramCounts), wordModel,
+                       backoffLogProbs, continuationLogProbs)
+
+def pruneModel(model, counts, minCount=0, topK=None, entropyThreshold=None):
+    """ Given a bigram model and the counts it was built from, return a smaller model keeping only its useful bigrams
+
+    A pruned bigram falls back to the unseen bigram log probability like any unseen bigram, and the probabilities
+    of the kept bigrams are unchanged. Bigrams seen fewer than minCount times are dropped first. Entropy pruning then
+    drops the bigrams whose removal changes the model the least, weighing the change of log probability by how often
+    the bigram occurs, (freq / total) * (log P(b) - log P_unseen(b)), and keeps those above entropyThreshold.
+    Finally only the topK most frequent bigrams are kept.
+
+    Args:
+        model (BigramModel): language model to prune
+        counts (DenseBigramCounts or SparseBigramCounts): bigram frequencies mapped onto the model's vocabulary
+        minCount (int): frequency a bigram must be seen at least to be kept
+        topK (int): largest number of bigrams kept, None keeps them all
+        entropyThreshold (float): smallest weighted log probability change of a kept bigram, None skips entropy pruning
+
+    Returns:
+        model (BigramModel): the pruned model
+    """
+    logger = logging.getLogger(__name__)
+    ids1, ids2, logProbs = model.seenBigrams()
+    freqs = counts.frequencies(ids1, ids2)
+
+    keep = freqs >= minCount
+    if entropyThreshold is not None:
+        total = max(int(counts.nonzero()[2].sum()), 1)
+        keep &= freqs / total * (logProbs - model.unseenLogProbs(ids1, ids2)) > entropyThreshold
+    if topK is not None and keep.sum() > topK:
+        kept = np.nonzero(keep)[0]
+        keep = np.zeros(len(freqs), dtype=bool)
+        keep[kept[np.argsort(-freqs[kept], kind='stable')[:topK]]] = True
+    logger.info('Kept {0} of {1} {2} bigrams'.format(int(keep.sum()), len(freqs), model.language))
+    return BigramModel.fromLogProbabilities(model.language, model.vocab, ids1[keep], ids2[keep], logProbs[keep],
+                                            model.unkLogProb, model.dense, model.wordModel, model.backoffLogProbs,
+                                            model.continuationLogProbs)
+
+def bigramFrequencies(counts):
+    """ Given bigram counts, return a dictionary of bigram keys and frequency values for all seen bigrams
+
+    Args:
+        counts (DenseBigramCounts or SparseBigramCounts): bigram frequencies
+
+    Returns:
+        bigramFreq (dict): a dictionary of bigram keys and frequency values
+    """
+    tokens = counts.vocab.tokens
+    ids1, ids2, freqs = counts.nonzero()
+    return {(tokens[i], tokens[j]): f for i, j, f in zip(ids1.tolist(), ids2.tolist(), freqs.tolist())}
+
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def hashNgrams(ids, hashBits):
+    """ Given token ids with the n-gram along the last axis, return the bucket of each n-gram in a 2 ** hashBits table
+
+    Args:
+        ids (np.ndarray): ... x n array of token ids, n may be 0 for the empty context of a unigram
+        hashBits (int): number of bits of the bucket index
+
+    Returns:
+        buckets (np.ndarray): ... array of int64 bucket indices
+    """
+    h = np.full(ids.shape[:-1], ids.shape[-1], dtype=np.uint64)
+    for j in range(ids.shape[-1]):
+        h = (h + ids[..., j].astype(np.uint64) + np.uint64(1)) * HASH_MULTIPLIER
+        h ^= h >> np.uint64(31)
+    return ((h * HASH_MULTIPLIER) >> np.uint64(64 - hashBits)).astype(np.int64)
+
+class HashedNgramCounter:
+    """ Counts the n-grams of a corpus and their contexts in fixed size tables indexed by a hash of the token ids
+
+    Memory is two 2 ** hashBits tables of counts whatever the order or the size of the corpus. N-grams whose hashes
+    collide share a count, so a larger table trades memory for fewer collisions. The vocabulary is fixed before
+    counting and tokens outside of it are counted as <unk>. Counters of later parts of a corpus are merged by adding
+    their tables.
+
+    Args:
+        vocab (Vocabulary): vocabulary the tokens are mapped onto
+        order (int): number of tokens in each n-gram
+        hashBits (int): number of bits of the bucket index of the count tables
+        wordModel (bool): count words if true and characters otherwise
+        batchSize (int): number of tokens buffered before they are folded into the counts
+    """
+    def __init__(self, vocab, order, hashBits=20, wordModel=False, batchSize=1 << 20):
+        if order < 2:
+            raise ValueError('Hashed n-gram order must be at least 2')
+        self.vocab = vocab
+        self.order = order
+        self.hashBits = hashBits
+        self.wordModel = wordModel
+        self.batchSize = batchSize
+        self.ngramCounts = np.zeros(1 << hashBits, dtype=np.int64)
+        self.contextCounts = np.zeros(1 << hashBits, dtype=np.int64)
+
+    def update(self, corpus):
+        """ Fold the n-grams of more lines into the counts
+
+        Args:
+            corpus (iterable): cleaned lines from a language corpus
+        """
+        index = self.vocab.index
+        unkId = self.vocab.unkId
+        buffer = []
+        buffered = 0
+        for line in corpus:
+            ids = [index.get(token, unkId) for token in tokenize(line, self.wordModel, self.order)]
+            buffer.append(ids)
+            buffered += len(ids)
+            if buffered >= self.batchSize:
+                self._flush(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            self._flush(buffer)
+
+    def _flush(self, lines):
+        lengths = np.fromiter((len(ids) for ids in lines), dtype=np.int64, count=len(lines))
+        ids = np.fromiter((i for ids in lines for i in ids), dtype=np.int64, count=int(lengths.sum()))
+
+        # Every token after the <start> padding ends an n-gram whose tokens all belong to its line
+        context = self.order - 1
+        starts = np.cumsum(lengths) - lengths
+        positions = np.arange(len(ids)) - np.repeat(starts, lengths)
+        ends = np.nonzero(positions >= context)[0]
+        windows = ids[ends[:, None] + np.arange(-context, 1)]
+        size = len(self.ngramCounts)
+        self.ngramCounts += np.bincount(hashNgrams(windows, self.hashBits), minlength=size)
+        self.contextCounts += np.bincount(hashNgrams(windows[:, :-1], self.hashBits), minlength=size)
+
+    def merge(self, others):
+        """ Add the counts of other counters with the same vocabulary, order and table size
+
+        Args:
+            others (list): HashedNgramCounter objects to add
+        """
+        for other in others:
+            if (other.vocab.tokens, other.order, other.hashBits) != (self.vocab.tokens, self.order, self.hashBits):
+                raise ValueError('Only counters with the same vocabulary, order and table size can be merged')
+            self.ngramCounts += other.ngramCounts
+            self.contextCounts += other.contextCounts
+
+class HashedNgramModel:
+    """ An order N add one smoothed language model backed by hashed count tables
+
+    The probability of a token given its N - 1 preceding tokens h is (c(h, token) + 1) / (c(h) + V). Both logs are
+    precomputed per bucket, so scoring an n-gram is two table lookups and a subtraction.
+
+    Args:
+        language (str): name of the language
+        vocab (Vocabulary): vocabulary of the language
+        order (int): number of tokens in each n-gram
+        logNgrams (np.ndarray): log(c(h, token) + 1) of every bucket
+        logContexts (np.ndarray): log(c(h) + V) of every bucket
+        wordModel (bool): true if the model is a word model and false if it is a character model
+    """
+    def __init__(self, language, vocab, order, logNgrams, logContexts, wordModel):
+        self.language = language
+        self.vocab = vocab
+        self.order = order
+        self.hashBits = int(len(logNgrams)).bit_length() - 1
+        self.logNgrams = logNgrams
+        self.logContexts = logContexts
+        self.wordModel = wordModel
+
+    @classmethod
+    def fromCounter(cls, counter, language, dtype=np.float32):
+        """ Build an add one smoothed model from hashed counts
+
+        Args:
+            counter (HashedNgramCounter): n-gram and context counts of the language
+            language (str): name of the language
+            dtype (np.dtype): float type of the log tables, float32 halves their memory
+
+        Returns:
+            model (HashedNgramModel): the language model
+        """
+        V = len(counter.vocab)
+        logNgrams = np.log1p(counter.ngramCounts).astype(dtype)
+        logContexts = np.log(counter.contextCounts + V).astype(dtype)
+        return cls(language, counter.vocab, counter.order, logNgrams, logContexts, counter.wordModel)
+
+    @property
+    def nbytes(self):
+        """ Size of the log tables in bytes """
+        return self.logNgrams.nbytes + self.logContexts.nbytes
+
+    def ngramLogProbs(self, ids):
+        """ Given the ids of the tokens of B n-grams, return the log probability of each n-gram
+
+        Args:
+            ids (np.ndarray): B x N matrix of token ids
+
+        Returns:
+            logProbs (np.ndarray): log probability of each n-gram
+        """
+        ngrams = self.logNgrams[hashNgrams(ids, self.hashBits)]
+        contexts = self.logContexts[hashNgrams(ids[:, :-1], self.hashBits)]
+        return ngrams.astype(np.float64) - contexts
@@ -2,11 +2,191 @@
 Author: Lauren Gardiner
 Date: 11/1/18
 """
+import os
+import sys
+import codecs
 import string
-import operator
+import queue
+import threading
+import itertools
 from collections import Counter
-import math
 import logging
+import instrumentation
+
+# Translation table removing every punctuation character in a single pass
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# Characters str.splitlines treats as line boundaries
+LINE_BOUNDARIES = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
+def cleanText(text):
+    """ Given raw text, remove the punctuation in a single pass with a translation table and lowercase it
+
+    Args:
+        text (str): raw text, such as a line or a chunk of a corpus
+
+    Returns:
+        text (str): cleaned text
+    """
+    return text.translate(PUNCTUATION_TABLE).lower()
+
+def readChunks(filepath, chunkSize=1 << 20, language=None):
+    """ This function takes a file path and yields the cleaned lines of the corpus one chunk at a time
+
+    Each chunk of chunkSize characters is cleaned in one pass with a translation table and lowercased. A line that
+    is cut by the end of a chunk is carried over to the next one, so only one chunk is held in memory at a time.
+    Reading and cleaning each chunk is recorded as a run of the read stage of the language.
+
+    Args:
+        filepath (str): filepath to the corpus text file
+        chunkSize (int): number of characters read at a time
+        language (str): language of the corpus the read stage is recorded for, None for a test corpus
+
+    Yields:
+        lines (list): cleaned lines completed by the chunk
+    """
+    with open(filepath, 'r', encoding='utf-8', errors="surrogateescape") as f:
+        pending = ''
+        while True:
+            with instrumentation.stage('read', language) as record:
+                chunk = f.read(chunkSize)
+                text = pending + cleanText(chunk)
+                if chunk and text:
+                    lines = text.splitlines()
+                    pending = '' if text[-1] in LINE_BOUNDARIES else lines.pop()
+                    record.items = len(lines)
+            if not chunk:
+                break
+            if not text:
+                continue
+            yield lines
+        if pending:
+            yield [pending]
+
+def prefetch(iterable, depth=2):
+    """ Iterate over an iterable in a background thread, holding at most depth items ahead of the consumer
+
+    This overlaps reading and cleaning a corpus with the work done on the lines already read.
+
+    Args:
+        iterable (iterable): items to produce in the background
+        depth (int): number of items buffered ahead of the consumer
+
+    Yields:
+        item: the items of the iterable in order
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as e:
+            put((False, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            more, item = items.get()
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+def iterCorpus(filepath, chunkSize=1 << 20, prefetchDepth=2, language=None):
+    """ This function takes a file path and lazily yields the cleaned lines of the corpus
+
+    Lines are cleaned exactly as readCorpus cleans them, but the file is read in chunks so memory stays bounded.
+
+    Args:
+        filepath (str): filepath to the corpus text file
+        chunkSize (int): number of characters read at a time
+        prefetchDepth (int): number of chunks read ahead in a background thread, 0 reads in the calling thread
+        language (str): language of the corpus the read stage is recorded for, None for a test corpus
+
+    Yields:
+        line (str): cleaned line of the corpus
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Loading {0} corpus'.format(filepath))
+
+    chunks = readChunks(filepath, chunkSize, language)
+    if prefetchDepth:
+        chunks = prefetch(chunks, prefetchDepth)
+    for lines in chunks:
+        yield from lines
+
+class CorpusReader:
+    """ A re-iterable view of the cleaned lines of a corpus file, each iteration streams the file with iterCorpus
+
+    Args:
+        filepath (str): filepath to the corpus text file
+        chunkSize (int): number of characters read at a time
+        prefetchDepth (int): number of chunks read ahead in a background thread
+        language (str): language of the corpus the read stage is recorded for, None for a test corpus
+    """
+    def __init__(self, filepath, chunkSize=1 << 20, prefetchDepth=2, language=None):
+        self.filepath = filepath
+        self.chunkSize = chunkSize
+        self.prefetchDepth = prefetchDepth
+        self.language = language
+
+    def __iter__(self):
+        return iterCorpus(self.filepath, self.chunkSize, self.prefetchDepth, self.language)
+
+def readAvailable(filepath, chunkSize=1 << 16):
+    """ This function takes a file path, or - for stdin, and yields the cleaned lines completed by each read
+
+    Unlike readChunks, a read returns as soon as any input is available instead of waiting for a full chunk, so
+    lines piped in a few at a time are yielded as they arrive. Lines are cleaned exactly as readCorpus cleans them.
+
+    Args:
+        filepath (str): filepath to the text file, - reads from stdin
+        chunkSize (int): largest number of bytes read at a time
+
+    Yields:
+        lines (list): cleaned lines completed by the read
+    """
+    stream = sys.stdin.buffer if filepath == '-' else open(filepath, 'rb')
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='surrogateescape')
+    try:
+        pending = ''
+        while True:
+            data = stream.read1(chunkSize)
+            text = pending + cleanText(decoder.decode(data, final=not data))
+            if not data:
+                if text:
+                    yield text.splitlines()
+                return
+            # A carriage return may be followed by a newline in the next read, both end the same line
+            carry = ''
+            if text.endswith('\r'):
+                text, carry = text[:-1], '\r'
+            if not text:
+                pending = carry
+                continue
+            lines = text.splitlines()
+            pending = ('' if text[-1] in LINE_BOUNDARIES else lines.pop()) + carry
+            if lines:
+                yield lines
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
 
 def readCorpus(filepath):
     """ This function takes a file path and returns the cleaned corpus as a list of lines
@@ -19,15 +199,9 @@ def readCorpus(filepath):
     Returns:
         lines (list): cleaned corpus as a list of lines
     """
-    logger = logging.getLogger(__name__)
-    logger.info('Loading {0} corpus'.format(filepath))
-
-    with open(filepath, 'r', encoding='utf-8', errors="surrogateescape") as f:
-        corpus = f.read()
-    for p in string.punctuation:
-        corpus = corpus.replace(p, "")
-    corpus = corpus.replace(r"\s", " ")
-    lines = corpus.lower().splitlines()
+    with instrumentation.stage('readCorpus') as record:
+        lines = list(iterCorpus(filepath, prefetchDepth=0))
+        record.items = len(lines)
     return lines
 
 def loadSolution(filepath):
@@ -42,9 +216,11 @@ def loadSolution(filepath):
     logger = logging.getLogger(__name__)
     logger.info('Loading solution file')
 
-    with open(filepath, 'r') as f:
-        lines = f.readlines()
-    solution = [line.split()[1] for line in lines]
+    with instrumentation.stage('loadSolution') as record:
+        with open(filepath, 'r') as f:
+            lines = f.readlines()
+        solution = [line.split()[1] for line in lines]
+        record.items = len(solution)
     return solution
 
 def createOOV(unigramFreq, threshold):
@@ -74,63 +250,87 @@ def createOOV(unigramFreq, threshold):
     logger.info('{0} were removed from the vocabulary'.format(len(OOV)))
     return unigramFreq, OOV
 
-def calcLangProbs(line, model, vocab):
-    """ Given a line from a corpus, a language model, and vocabulary, return the probability of the line being from the language
+def calcLangProbs(line, model):
+    """ Given a line from a corpus and a language model, return the probability of the line being from the language
 
     Args:
         line (list): list of characters/words from a line in a corpus
-        model (dict): a dictionary of bigram keys and probability values for all seen bigrams
-        vocabulary (list): vocabulary for the language corpus
-    
+        model (engine.BigramModel): a language model with bigram log probabilities
+
     Returns:
-        langProb (float): probability that the line belongs to that language
-    """
-    langProb = 0
-    for i in range(len(line) - 1):
-        char1 = line[i]
-        char2 = line[i+1]
-        if char1 not in vocab:
-            char1 = '<unk>'
-        if char2 not in vocab:
-            char2 = '<unk>'
-        bigram = (char1, char2)
-        if (model.get(bigram, 0) == 0):
-            bigram = ('<unk>', '<unk>')
-        langProb += math.log(model[bigram])
-    return langProb
-
-def predictLanguage(testCorpus, englishCharModel, englishVocab, frenchCharModel, frenchVocab, italianCharModel, italianVocab, wordModel):
-    """ Given the test corpus, language models, and vocabulary return the language prediction for each line in the test corpus
+        langProb (float): log probability that the line belongs to that language
+    """
+    ids = model.vocab.encode(line)
+    return sum(model.bigramLogProbs(ids[:-1], ids[1:]).tolist())
+
+def predictLanguage(testCorpus, models, batchSize=1024):
+    """ Given the test corpus and language models return the language prediction for each line in the test corpus
+
+    Lines are scored in batches against all the languages at once with a scoring.BatchScorer.
 
     Args:
         testCorpus (list): list of lines from the test corpus
-        englishCharModel (dict): a dictionary of bigram keys and probability values for all seen bigrams in the English corrpus
-        englishVocab (list): vocabulary for the English corpus
-        frenchCharModel (dict): a dictionary of bigram keys and probability values for all seen bigrams in the French corrpus
-        frenchVocab (list): vocabulary for the French corpus
-        italianCharModel (dict): a dictionary of bigram keys and probability values for all seen bigrams in the Italian corrpus
-        italianVocab (list): vocabulary for the Italian corpus
+        models (list): an engine.BigramModel for each language, ties go to the language listed first
+        batchSize (int): number of lines scored at once
 
     Returns:
         results (list): prediction for each line in the test corpus
     """
+    from scoring import BatchScorer
+
     logger = logging.getLogger(__name__)
     logger.info('Predicting languages for {0} lines in the test corpus'.format(len(testCorpus)))
 
-    results = []
-    for line in testCorpus:
-        # Add start and end tokens
-        if wordModel:
-            line = '<start> ' + line + ' <end>'
-            line = line.split()
+    scorer = BatchScorer(models)
+    return predictBatches(testCorpus, scorer, batchSize)
+
+def iterBatches(lines, batchSize):
+    """ Group an iterable of lines into lists of at most batchSize lines
+
+    Args:
+        lines (iterable): lines to group
+        batchSize (int): number of lines in each batch
+
+    Yields:
+        batch (list): the next batchSize lines
+    """
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, batchSize))
+        if not batch:
+            return
+        yield batch
+
+def predictBatches(testCorpus, scorer, batchSize=1024, workers=1, pruneMargin=None, decisiveMargin=None, cache=None):
+    """ Given the test corpus and a scorer for the language models return the language prediction for each line
+
+    Args:
+        testCorpus (iterable): lines from the test corpus, such as a list or a CorpusReader
+        scorer (scoring.BatchScorer): scorer built from the language models or loaded from a model file
+        batchSize (int): number of lines scored at once
+        workers (int): number of processes scoring batches, see parallel.predictParallel
+        pruneMargin (float): drop languages this far behind the leader, see scoring.BatchScorer.scoreEarlyExit
+        decisiveMargin (float): stop scoring a line once its leader is this far ahead, None scores every bigram
+        cache (cache.PredictionCache): cache of line scores, each worker process uses its own copy
+
+    Returns:
+        results (list): prediction for each line in the test corpus
+    """
+    logger = logging.getLogger(__name__)
+
+    with instrumentation.stage('predict') as record:
+        if workers > 1:
+            from parallel import predictParallel
+            results = predictParallel(testCorpus, scorer, workers, batchSize, pruneMargin, decisiveMargin, cache)
         else:
-            line = ['<start>'] + list(line) + ['<end>']
-        predictions = {}
-        predictions['English'] = calcLangProbs(line, englishCharModel, englishVocab)
-        predictions['French'] = calcLangProbs(line, frenchCharModel, frenchVocab)
-        predictions['Italian'] = calcLangProbs(line, italianCharModel, italianVocab)
-        # Select the language with the highest probability
-        results.append(max(predictions.items(), key=operator.itemgetter(1))[0])
+            results = []
+            for batch in iterBatches(testCorpus, batchSize):
+                results.extend(scorer.predict(batch, pruneMargin, decisiveMargin, cache))
+        if cache is not None:
+            cache.logStats()
+            instrumentation.registerCache('prediction', cache)
+        record.items = len(results)
+    logger.info('Predicted languages for {0} lines in the test corpus'.format(len(results)))
     return results
 
 def evaluate(results, solution):
@@ -143,7 +343,8 @@ def evaluate(results, solution):
     logger = logging.getLogger(__name__)
     logger.info('Evaluating results')
 
-    accuracy = sum(1 for r,s in zip(results,solution) if r == s) / float(len(solution))
+    with instrumentation.stage('evaluate', items=len(solution)):
+        accuracy = sum(1 for r,s in zip(results,solution) if r == s) / float(len(solution))
 
     logger.info('Accuracy is {0}'.format(accuracy))
 
@@ -163,6 +364,157 @@ def writeResults(results, filepath):
     """
     logger = logging.getLogger(__name__)
     logger.info('Writing results to {0}'.format(filepath))
-    with open(filepath, "w") as f:
-        for i, line in enumerate(results):
-            f.write(str(i + 1) + "\t" + line + "\n")
\ No newline at end of file
+    with instrumentation.stage('writeResults', items=len(results)):
+        with open(filepath, "w") as f:
+            for i, line in enumerate(results):
+                f.write(str(i + 1) + "\t" + line + "\n")
+
+def iterSolution(filepath):
+    """ This function takes a file path and lazily yields the correct language of each line without the index
+
+    Args:
+        filepath (str): filepath to the solution text file
+
+    Yields:
+        language (str): correct language of the next line
+    """
+    with open(filepath, 'r') as f:
+        for line in f:
+            yield line.split()[1]
+
+class OnlineEvaluation:
+    """ Accuracy and confusion matrix updated one batch of predictions at a time, holding no predictions or labels
+
+    Args:
+        languages (list): languages that can be predicted, more are added as they appear in the labels
+    """
+    def __init__(self, languages):
+        self.languages = list(languages)
+        self.confusion = Counter()
+        self.total = 0
+        self.correct = 0
+
+    def update(self, results, solution):
+        """ Count a batch of predictions against their ground truth labels and log the incorrect ones
+
+        Args:
+            results (list): language predictions of the next lines
+            solution (list): ground truth labels of the same lines
+        """
+        logger = logging.getLogger(__name__)
+        for result, label in zip(results, solution):
+            self.total += 1
+            self.confusion[label, result] += 1
+            if result == label:
+                self.correct += 1
+            else:
+                logger.info("Line {0} is wrong. You predicted {1}, but it's actually {2}".format(self.total, result, label))
+            if label not in self.languages:
+                self.languages.append(label)
+
+    @property
+    def accuracy(self):
+        return self.correct / float(self.total) if self.total else None
+
+    def logStats(self):
+        """ Log the accuracy and the confusion matrix, with a row per true language and a column per prediction """
+        logger = logging.getLogger(__name__)
+        logger.info('Accuracy is {0}'.format(self.accuracy))
+        logger.info("{0} were predicted incorrectly".format(self.total - self.correct))
+        width = max(len(language) for language in self.languages)
+        rows = [' ' * width + ''.join(' {0:>{1}}'.format(language, width) for language in self.languages)]
+        for label in self.languages:
+            rows.append('{0:<{1}}'.format(label, width) + ''.join(' {0:>{1}}'.format(self.confusion[label, result], width)
+                                                                 for result in self.languages))
+        logger.info('Confusion matrix, rows are the true languages:\n' + '\n'.join(rows))
+
+def formatPredictions(results, scores=None, start=0, consumed=None, margins=None):
+    """ Given a batch of predictions, return their index\tlanguage output lines as one string
+
+    Args:
+        results (list): language predictions
+        scores (np.ndarray): N x L matrix of log probabilities appended to each line, None writes only the language
+        start (int): number of lines written before the batch, the first line is numbered start + 1
+        consumed (np.ndarray): number of n-grams early exit scored of each line, appended after the scores, or None
+        margins (np.ndarray): final early exit margin of each line, appended after consumed, or None
+
+    Returns:
+        text (str): one line per prediction, each ending with a newline
+    """
+    if scores is None:
+        return ''.join('{0}\t{1}\n'.format(start + i + 1, result) for i, result in enumerate(results))
+    columns = ['\t'.join('{0:.4f}'.format(score) for score in row) for row in scores.tolist()]
+    if consumed is not None:
+        columns = ['{0}\t{1}\t{2:.4f}'.format(text, count, margin)
+                   for text, count, margin in zip(columns, consumed.tolist(), margins.tolist())]
+    return ''.join('{0}\t{1}\t{2}\n'.format(start + i + 1, result, text) for i, (result, text) in enumerate(zip(results, columns)))
+
+def streamPredictions(inputPath, outputPath, scorer, batchSize=1024, pruneMargin=None, decisiveMargin=None, cache=None,
+                      withScores=False, solutionPath=None, chunkSize=1 << 16):
+    """ Classify the lines of a file or stdin and write each prediction as soon as its batch is scored
+
+    Lines are scored in batches of at most batchSize lines, but a batch is scored as soon as the lines read so far
+    are used up, so the first predictions are written without waiting for the rest of the input. Each batch is
+    written with one call and flushed. Memory stays bounded by the batch, whatever the size of the input.
+
+    Args:
+        inputPath (str): filepath to the text file to classify, - reads from stdin
+        outputPath (str): filepath to write index\tlanguage lines to, - writes to stdout
+        scorer (scoring.BatchScorer): scorer built from the language models or loaded from a model file
+        batchSize (int): largest number of lines scored at once
+        pruneMargin (float): early exit prune margin, see scoring.BatchScorer.scoreEarlyExit
+        decisiveMargin (float): early exit decisive margin, see scoring.BatchScorer.scoreEarlyExit
+        cache (cache.PredictionCache): cache of line scores consulted before scoring, None scores every line
+        withScores (bool): also write the log probability of every language, in the order of scorer.languages,
+            followed with early exit by the number of n-grams scored and the final margin of each line
+        solutionPath (str): filepath to the ground truth labels to evaluate the predictions against online, or None
+        chunkSize (int): largest number of bytes read at a time
+
+    Returns:
+        evaluation (OnlineEvaluation): accuracy and confusion matrix of the predictions, None without a solutionPath
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Streaming predictions for {0} to {1}'.format('stdin' if inputPath == '-' else inputPath,
+                                                              'stdout' if outputPath == '-' else outputPath))
+    earlyExit = pruneMargin is not None or decisiveMargin is not None
+    if withScores:
+        logger.info('Scores are written in the order {0}{1}'.format(', '.join(scorer.languages),
+                    ', then the n-grams scored and the final margin' if earlyExit else ''))
+
+    evaluation = OnlineEvaluation(scorer.languages) if solutionPath else None
+    solution = iterSolution(solutionPath) if solutionPath else None
+    languages = scorer.languages
+    out = sys.stdout if outputPath == '-' else open(outputPath, 'w')
+    index = 0
+    try:
+        with instrumentation.stage('stream') as record:
+            for lines in readAvailable(inputPath, chunkSize):
+                for batch in iterBatches(lines, batchSize):
+                    scores, consumed, margins = scorer.scoreBatch(batch, pruneMargin, decisiveMargin, cache, details=True)
+                    results = [languages[i] for i in scores.argmax(axis=1).tolist()]
+                    if withScores:
+                        out.write(formatPredictions(results, scores, index, consumed, margins))
+                    else:
+                        out.write(formatPredictions(results, start=index))
+                    out.flush()
+                    if evaluation is not None:
+                        evaluation.update(results, list(itertools.islice(solution, len(results))))
+                    index += len(batch)
+                    record.items = index
+    except BrokenPipeError:
+        # The reader of the output went away, such as head, so stop classifying without a traceback on exit
+        logger.info('Output closed after {0} lines'.format(index))
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    logger.info('Predicted languages for {0} lines'.format(index))
+    if cache is not None:
+        cache.logStats()
+        instrumentation.registerCache('prediction', cache)
+    if evaluation is not None:
+        if evaluation.total < index:
+            logger.warning('The solution only labels {0} of the {1} lines'.format(evaluation.total, index))
+        evaluation.logStats()
+    return evaluation
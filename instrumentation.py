@@ -0,0 +1,296 @@
+"""
+Opt-in instrumentation of the training and prediction stages.
+
+Stages are wrapped in instrumentation.stage, which does nothing until instrumentation.enable is called. Once enabled,
+every stage records its wall time, CPU time, items processed and, with traceMemory, the peak memory traced by
+tracemalloc above what was allocated when the stage started. Stages are aggregated per stage name and language and
+exported with the statistics of any registered prediction cache as JSON or in the Prometheus text format. Stages can
+run in several threads, such as the read stage of a prefetching corpus reader, each thread nesting its own stages
+and measuring its own CPU time. Tasks of worker processes are run with runInWorker, which returns the totals of their
+stages for the parent process to merge, so the totals of a stage add up its runs in every process.
+"""
+import json
+import time
+import logging
+import threading
+import contextlib
+import tracemalloc
+
+FORMATS = ('json', 'prometheus')
+
+class StageRecord:
+    """ Measurements of one run of a stage, the stage sets items once it knows how many it processed
+
+    Args:
+        items (int): number of items the stage processes, such as lines or tokens
+    """
+    def __init__(self, items=None):
+        self.items = items
+        self.startBytes = 0
+        self.peakBytes = 0
+
+class Instrumentation:
+    """ Collects per stage and per language measurements
+
+    Args:
+        traceMemory (bool): measure the peak memory of every stage with tracemalloc, which slows allocations down
+    """
+    def __init__(self, traceMemory=False):
+        self.traceMemory = traceMemory
+        self.stages = {}
+        self.caches = {}
+        self.threads = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def open(self):
+        """ Stages open in the calling thread, innermost last """
+        if not hasattr(self.threads, 'open'):
+            self.threads.open = []
+        return self.threads.open
+
+    @contextlib.contextmanager
+    def stage(self, name, language=None, items=None):
+        """ Measure the block run inside the context as one run of a stage
+
+        Args:
+            name (str): name of the stage
+            language (str): language the stage works on, None for stages over all languages
+            items (int): number of items the stage processes, can be set later on the yielded StageRecord
+
+        Yields:
+            record (StageRecord): measurements of this run
+        """
+        record = StageRecord(items)
+        if self.traceMemory:
+            # Credit the peak so far to the enclosing stages before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in self.open:
+                outer.peakBytes = max(outer.peakBytes, peak)
+            tracemalloc.reset_peak()
+            record.startBytes = record.peakBytes = current
+        self.open.append(record)
+        started = time.perf_counter()
+        cpuStarted = time.thread_time()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            cpuSeconds = time.thread_time() - cpuStarted
+            self.open.pop()
+            if self.traceMemory:
+                peak = tracemalloc.get_traced_memory()[1]
+                for outer in self.open + [record]:
+                    outer.peakBytes = max(outer.peakBytes, peak)
+            self.add(name, language, seconds, cpuSeconds, record)
+
+    def add(self, name, language, seconds, cpuSeconds, record):
+        """ Aggregate one run of a stage into the totals of the stage and language """
+        with self.lock:
+            stats = self.stages.setdefault((name, language), {'stage': name, 'language': language, 'calls': 0,
+                                                              'seconds': 0.0, 'cpuSeconds': 0.0, 'items': 0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['cpuSeconds'] += cpuSeconds
+            stats['items'] += record.items or 0
+            if self.traceMemory:
+                stats['peakBytes'] = max(stats.get('peakBytes', 0), record.peakBytes - record.startBytes)
+
+    def merge(self, stages):
+        """ Aggregate the stage totals measured by another collector, such as one of a worker process, into these totals
+
+        Args:
+            stages (list): stage totals as returned by runInWorker
+        """
+        with self.lock:
+            for other in stages:
+                stats = self.stages.setdefault((other['stage'], other['language']),
+                                               {'stage': other['stage'], 'language': other['language'], 'calls': 0,
+                                                'seconds': 0.0, 'cpuSeconds': 0.0, 'items': 0})
+                for key in ('calls', 'seconds', 'cpuSeconds', 'items'):
+                    stats[key] += other[key]
+                if 'peakBytes' in other:
+                    stats['peakBytes'] = max(stats.get('peakBytes', 0), other['peakBytes'])
+
+    def snapshot(self):
+        """ Return the stage totals and cache statistics as a JSON serializable dictionary """
+        stages = []
+        with self.lock:
+            totals = [dict(stats) for stats in self.stages.values()]
+        for stats in totals:
+            stats['itemsPerSecond'] = stats['items'] / stats['seconds'] if stats['items'] and stats['seconds'] else None
+            stages.append(stats)
+        return {'stages': stages, 'caches': {name: cache.stats() for name, cache in self.caches.items()}}
+
+    def prometheus(self):
+        """ Return the stage totals and cache statistics in the Prometheus text exposition format """
+        lines = []
+        def family(metric, kind, description, samples):
+            lines.append('# HELP langid_{0} {1}'.format(metric, description))
+            lines.append('# TYPE langid_{0} {1}'.format(metric, kind))
+            for labels, value in samples:
+                labelText = ','.join('{0}="{1}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                                     for key, label in labels.items() if label is not None)
+                lines.append('langid_{0}{{{1}}} {2}'.format(metric, labelText, repr(float(value))))
+
+        with self.lock:
+            stages = [dict(stats) for stats in self.stages.values()]
+        labels = [{'stage': stats['stage'], 'language': stats['language']} for stats in stages]
+        family('stage_calls_total', 'counter', 'Number of runs of the stage', [(l, s['calls']) for l, s in zip(labels, stages)])
+        family('stage_seconds_total', 'counter', 'Wall time spent in the stage', [(l, s['seconds']) for l, s in zip(labels, stages)])
+        family('stage_cpu_seconds_total', 'counter', 'CPU time spent in the stage', [(l, s['cpuSeconds']) for l, s in zip(labels, stages)])
+        family('stage_items_total', 'counter', 'Items processed by the stage', [(l, s['items']) for l, s in zip(labels, stages)])
+        if self.traceMemory:
+            family('stage_peak_bytes', 'gauge', 'Peak traced memory allocated by the stage',
+                   [(l, s.get('peakBytes', 0)) for l, s in zip(labels, stages)])
+        caches = {name: cache.stats() for name, cache in self.caches.items()}
+        for counter in ('hits', 'misses', 'evictions'):
+            family('cache_{0}_total'.format(counter), 'counter', 'Prediction cache {0}'.format(counter),
+                   [({'cache': name}, stats[counter]) for name, stats in caches.items()])
+        family('cache_size', 'gauge', 'Lines held by the prediction cache', [({'cache': name}, stats['size']) for name, stats in caches.items()])
+        return '\n'.join(lines) + '\n'
+
+    def export(self, filepath, format='json'):
+        """ Write the measurements to a file as JSON or in the Prometheus text format
+
+        Args:
+            filepath (str): filepath to write the measurements to
+            format (str): json or prometheus
+        """
+        logger = logging.getLogger(__name__)
+        logger.info('Writing stage metrics to {0}'.format(filepath))
+        with open(filepath, 'w') as f:
+            if format == 'prometheus':
+                f.write(self.prometheus())
+            else:
+                f.write(json.dumps(self.snapshot(), indent=2) + '\n')
+
+_active = None
+_inactive = contextlib.nullcontext(StageRecord())
+
+def enable(traceMemory=False):
+    """ Start collecting measurements for every instrumented stage and return the collector """
+    global _active
+    if traceMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _active = Instrumentation(traceMemory)
+    return _active
+
+def disable():
+    """ Stop collecting measurements """
+    global _active
+    if _active is not None and _active.traceMemory:
+        tracemalloc.stop()
+    _active = None
+
+def active():
+    """ Return the collector if instrumentation is enabled and None otherwise """
+    return _active
+
+def stage(name, language=None, items=None):
+    """ Measure the block run inside the context as one run of a stage if instrumentation is enabled
+
+    Args:
+        name (str): name of the stage
+        language (str): language the stage works on, None for stages over all languages
+        items (int): number of items the stage processes, can be set later on the yielded StageRecord
+
+    Returns:
+        context: yields the StageRecord of the run, which is discarded when instrumentation is disabled
+    """
+    if _active is None:
+        return _inactive
+    return _active.stage(name, language, items)
+
+def workerSettings():
+    """ Return what runInWorker needs to measure a task like this process does, None if instrumentation is disabled """
+    return None if _active is None else _active.traceMemory
+
+def runInWorker(settings, function, *args, **kwargs):
+    """ Run a task of a worker process, measuring its stages with a collector of its own
+
+    A forked worker inherits a copy of its parent's collector, whose totals would be lost with the process, so every
+    task is measured from empty totals that are returned for the parent to fold in with mergeStages.
+
+    Args:
+        settings: value of workerSettings in the parent process
+        function (callable): module level function running the task
+        *args: positional arguments of the function
+        **kwargs: keyword arguments of the function
+
+    Returns:
+        result: result of the function
+        stages (list): totals of the stages the task ran, None if instrumentation is disabled in the parent
+    """
+    global _active
+    previous = _active
+    if settings is None:
+        _active = None
+    else:
+        if settings and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = Instrumentation(settings)
+    try:
+        result = function(*args, **kwargs)
+        stages = None if _active is None else [dict(stats) for stats in _active.stages.values()]
+    finally:
+        _active = previous
+    return result, stages
+
+def mergeStages(stages):
+    """ Fold the stage totals returned by runInWorker into this process's totals if instrumentation is enabled """
+    if _active is not None and stages:
+        _active.merge(stages)
+
+def registerCache(name, cache):
+    """ Report the statistics of a cache.PredictionCache with the measurements if instrumentation is enabled """
+    if _active is not None and cache is not None:
+        _active.caches[name] = cache
+
+def addArguments(parser):
+    """ Add the instrumentation and profiling options to a script's argument parser """
+    parser.add_argument('--metricsPath', default=None, help='Record per stage timings and write them to this file')
+    parser.add_argument('--metricsFormat', default='json', choices=FORMATS, help='Format of the file written to --metricsPath')
+    parser.add_argument('--traceMemory', action='store_true', help='Also record the peak memory of every stage, which slows the run down')
+    parser.add_argument('--profilePath', default=None, help='Profile the run with cProfile and write the stats to this file')
+
+def checkArguments(parser, args):
+    """ Reject options of addArguments that would otherwise be silently ignored
+
+    Args:
+        parser (argparse.ArgumentParser): parser the options were added to, which reports the error
+        args (argparse.Namespace): parsed arguments of a script
+    """
+    if args.traceMemory and not args.metricsPath:
+        parser.error('--traceMemory requires --metricsPath, the peak memory is only written with the metrics')
+
+@contextlib.contextmanager
+def instrumented(args):
+    """ Run the block with the instrumentation and profiling requested by the options of addArguments
+
+    Args:
+        args (argparse.Namespace): parsed arguments of a script
+    """
+    logger = logging.getLogger(__name__)
+    collector = enable(args.traceMemory) if args.metricsPath else None
+    profiler = None
+    if args.profilePath:
+        # Imported only when profiling so short lived runs do not pay for them
+        import io
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with stage('total'):
+            yield collector
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profilePath)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+            logger.info('Wrote cProfile stats to {0}\n{1}'.format(args.profilePath, summary.getvalue()))
+        if collector is not None:
+            collector.export(args.metricsPath, args.metricsFormat)
+            disable()
@@ -0,0 +1,125 @@
+"""
+Single entry point for training, predicting, evaluating and benchmarking the language models.
+
+    python langId.py train --model char|word|GT|KN [options of the model's script]
+    python langId.py predict --modelPath wordLangId2.model "Signora Presidente"
+    python langId.py predict --modelPath wordLangId2.model --testPath - --outputPath - < lines.txt
+    python langId.py eval --modelPath wordLangId2.model
+    python langId.py bench startup
+
+Only the modules a command needs are imported once it runs, so predict loads the memory mapped model file and
+classifies without importing the training code or reading any corpus.
+"""
+import sys
+import logging
+import argparse
+import importlib
+import instrumentation
+
+# Script that builds each model type, its default model file and the options selecting the type, train parses the
+# options with the script's parser and builds the models with its scorer builder in the shared cli.train flow
+MODEL_TYPES = {'char': ('letterLangId', 'letterLangId.model', []),
+               'word': ('wordLangId', 'wordLangId.model', []),
+               'GT': ('wordLangId2', 'wordLangId2.model', ['--smoothing', 'GT']),
+               'KN': ('wordLangId2', 'wordLangIdKN.model', ['--smoothing', 'KN'])}
+
+parser = argparse.ArgumentParser(description='Language identification with character and word bigram models')
+subparsers = parser.add_subparsers(dest='command', required=True)
+
+trainParser = subparsers.add_parser('train', help='Train a model and save it to --modelPath, other options are passed on to the script of the model type')
+trainParser.add_argument('--model', default='GT', choices=list(MODEL_TYPES), help='char for character bigrams, word for add one word bigrams, GT for Good Turing and KN for Kneser-Ney word bigrams')
+trainParser.add_argument('--modelPath', default=None, help='Path of the binary model file to write, a file named after the model type if omitted')
+instrumentation.addArguments(trainParser)
+
+def addPredictionArguments(commandParser):
+    commandParser.add_argument('--modelPath', default='wordLangId2.model', help='Path of the binary model file written by train')
+    commandParser.add_argument('--pruneMargin', default=None, type=float, help='Stop scoring a language once its log probability is this far behind the leader')
+    commandParser.add_argument('--decisiveMargin', default=None, type=float, help='Stop scoring a line once its leading language is this far ahead of the others')
+    commandParser.add_argument('--cacheSize', default=0, type=int, help='Number of cleaned lines whose scores are cached for repeated lines, 0 disables the cache')
+    commandParser.add_argument('--cachePolicy', default='lru', choices=['lru', 'fifo'], help='Eviction policy of the prediction cache')
+    commandParser.add_argument('--withScores', action='store_true', help='Also write the log probability of every language, and with early exit the n-grams scored and the final margin')
+    instrumentation.addArguments(commandParser)
+
+predictParser = subparsers.add_parser('predict', help='Classify the given texts, or stream the lines of --testPath')
+predictParser.add_argument('texts', nargs='*', help='Texts to classify, each is cleaned and classified as one line')
+predictParser.add_argument('--testPath', default='-', help='Input path of the lines to classify when no texts are given, - reads stdin')
+predictParser.add_argument('--outputPath', default='-', help='Output path for predictions, - writes stdout')
+addPredictionArguments(predictParser)
+
+evalParser = subparsers.add_parser('eval', help='Classify --testPath and evaluate the predictions against --solutionPath')
+evalParser.add_argument('--testPath', default='LangId.test', help='Input path for test corpus')
+evalParser.add_argument('--solutionPath', default='LangId.sol', help='Input path for solution')
+evalParser.add_argument('--outputPath', default=None, help='Output path for predictions, which are not written if omitted')
+addPredictionArguments(evalParser)
+
+benchParser = subparsers.add_parser('bench', add_help=False, help='Run bench.py, all options are passed on to it')
+
+def loadPredictor(args):
+    """ Load the scorer and the prediction cache requested by the options of a predict or eval command """
+    from modelStore import loadScorer
+    from cache import PredictionCache
+
+    scorer = loadScorer(args.modelPath)
+    cache = PredictionCache(args.cacheSize, args.cachePolicy) if args.cacheSize > 0 else None
+    return scorer, cache
+
+def train(args):
+    import cli
+
+    scriptName, modelPath, typeOptions = MODEL_TYPES[args.model]
+    script = importlib.import_module(scriptName)
+    options = ['train', '--modelPath', args.modelPath or modelPath] + typeOptions + args.options
+    cli.train(script.parser.parse_args(options), script.buildScorer)
+
+def predict(args):
+    from helper import cleanText, formatPredictions, streamPredictions
+
+    scorer, cache = loadPredictor(args)
+    if not args.texts:
+        streamPredictions(args.testPath, args.outputPath, scorer, pruneMargin=args.pruneMargin,
+                          decisiveMargin=args.decisiveMargin, cache=cache, withScores=args.withScores)
+        return
+    scores, consumed, margins = scorer.scoreBatch([cleanText(text) for text in args.texts], args.pruneMargin,
+                                                  args.decisiveMargin, cache, details=True)
+    results = [scorer.languages[i] for i in scores.argmax(axis=1).tolist()]
+    text = formatPredictions(results, scores, 0, consumed, margins) if args.withScores else formatPredictions(results)
+    if args.outputPath == '-':
+        sys.stdout.write(text)
+    else:
+        with open(args.outputPath, 'w') as f:
+            f.write(text)
+
+def evaluate(args):
+    import os
+    from helper import streamPredictions
+
+    scorer, cache = loadPredictor(args)
+    streamPredictions(args.testPath, args.outputPath or os.devnull, scorer, pruneMargin=args.pruneMargin,
+                      decisiveMargin=args.decisiveMargin, cache=cache, withScores=args.withScores,
+                      solutionPath=args.solutionPath)
+
+def bench(args):
+    import bench as benchmarks
+    benchmarks.main(benchmarks.parser.parse_args(args.options))
+
+COMMANDS = {'train': train, 'predict': predict, 'eval': evaluate, 'bench': bench}
+
+def main(args):
+    if args.options and args.command not in ('train', 'bench'):
+        parser.error('unrecognized arguments: {0}'.format(' '.join(args.options)))
+    if args.command == 'bench':
+        COMMANDS['bench'](args)
+        return
+    instrumentation.checkArguments(parser, args)
+    with instrumentation.instrumented(args):
+        COMMANDS[args.command](args)
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    logger = logging.getLogger(__name__)
+
+    # train and bench pass the options they do not know on to the script they run
+    args, options = parser.parse_known_args()
+    args.options = options
+    main(args)
@@ -3,82 +3,123 @@ Author: Lauren Gardiner
 Date: 11/1/18
 """
 from collections import Counter
-import argparse
 import logging
-from helper import readCorpus, loadSolution, createOOV, calcLangProbs, predictLanguage, evaluate, writeResults
-
-parser = argparse.ArgumentParser(description='Character level language model')
-parser.add_argument('--englishPath', default='LangId.train.English', help='Input path for English corpus')
-parser.add_argument('--frenchPath', default='LangId.train.French', help='Input path for French corpus')
-parser.add_argument('--italianPath', default='LangId.train.Italian', help='Input path for Italian corpus')
-parser.add_argument('--testPath', default='LangId.test', help='Input path for test corpus')
-parser.add_argument('--solutionPath', default='LangId.sol', help='Input path for solution')
-parser.add_argument('--outputPath', default='letterLangId.out', help='Output path for predictions')
-parser.add_argument('--unkThreshold', default=30, help='Frequency threshold to be included in vocabulary')
-
-def charModel(corpus, threshold, language):
+from engine import NgramCounter, Vocabulary, addOneModel, tokenize, HashedNgramCounter, HashedNgramModel
+from helper import createOOV
+from scoring import HashedNgramScorer
+import cli
+import instrumentation
+
+parser = cli.createParser('Character level language model', 'letterLangId', unkThreshold=30)
+parser.add_argument('--order', default=2, type=int, help='Number of characters in each n-gram, at least 2, orders above 2 are counted in hashed tables')
+parser.add_argument('--hashBits', default=20, type=int, help='Each language holds two tables of 2 ** hashBits counts for orders above 2')
+
+def charModel(corpus, threshold, language, counter=None):
     """ This function take a corpus and an OOV threshold and returns the vocabulary and the probabilities of seeing two characters.
 
     Characters that are seen less than the threshold are converted to an unknown token <unk>
 
     Args:
-        corpus (list): list of lines from a language corpus
+        corpus (iterable): lines from a language corpus, such as a list or a helper.CorpusReader, iterated once
         threshold (int): frequency value a word must be seen more than to be included in the vocabulary
+        language (str): name of the language
+        counter (engine.NgramCounter): counts to fold the corpus into, such as counts loaded with modelStore.loadCounters
 
     Returns:
-        mle (dict): a dictionary of bigram keys and probability values for all seen bigrams
-        unigramFreq.keys() (list): vocabulary for the language corpus
+        model (engine.BigramModel): bigram log probabilities and vocabulary for the language corpus
     """
     logger = logging.getLogger(__name__)
     logger.info('Creating {0} character model'.format(language))
 
-    # Add start and end sentence tokens in each line and split into a list of characters
-    corpus = [['<start>'] + list(line) + ['<end>'] for line in corpus]
+    # Count characters and character bigrams in a single pass, adding start and end sentence tokens to each line
+    if counter is None:
+        counter = NgramCounter(wordModel=False)
+    with instrumentation.stage('count', language) as record:
+        counted = counter.position
+        counter.update(corpus)
+        record.items = counter.position - counted
     # Create a dictionary with character keys and frequency values
-    unigramFreq = sum([Counter(line) for line in corpus], Counter())
+    unigramFreq = counter.unigramFrequencies()
     unigramFreq, OOV = createOOV(unigramFreq, threshold)
     
-    # Create a dictionary with bigram character keys and frequency values
-    bigramFreq = {}
-    for line in corpus:
-        for i in range(len(line) - 1):
-            char1 = line[i]
-            char2 = line[i+1]
-            if char1 in OOV:
-                char1 = '<unk>'
-            if char2 in OOV:
-                char2 = '<unk>'
-            bigram = (char1, char2)
-            if bigram in bigramFreq.keys():
-                bigramFreq[bigram] += 1
-            else:
-                bigramFreq[bigram] = 1
     # Add unknown characters to dictionary if there are none due to a threshold of 0
     if unigramFreq.get('<unk>', 0) == 0:
         unigramFreq['<unk>'] = 0
-    if bigramFreq.get(('<unk>', '<unk>'), 0) == 0:
-        bigramFreq[('<unk>', '<unk>')] = 0
-    # Calculate bigram probabilities
-    mle = {bigram: (bigramFreq[bigram] + 1) / (unigramFreq[bigram[0]] + len(unigramFreq.keys())) for bigram in bigramFreq.keys()}
-    return mle, unigramFreq.keys()
+    # Map the bigram counts onto character ids in a dense matrix, out of vocabulary characters map to <unk>
+    vocab = Vocabulary(unigramFreq.keys())
+    with instrumentation.stage('buildModel', language, items=len(vocab)):
+        counts = counter.bigramCounts(vocab, dense=True)
+        # Calculate bigram probabilities
+        return addOneModel(unigramFreq, counts, language, wordModel=False)
 
-def main(args):
-    # Load corpora and solution
-    englishCorpus = readCorpus(args.englishPath)
-    frenchCorpus = readCorpus(args.frenchPath)
-    italianCorpus = readCorpus(args.italianPath)
-    testCorpus = readCorpus(args.testPath)
-    solution = loadSolution(args.solutionPath)
+def hashedCharModel(corpus, threshold, language, order, hashBits):
+    """ This function take a corpus and an OOV threshold and returns the vocabulary and the probabilities of seeing a character after the order - 1 characters before it.
+
+    The vocabulary is counted in a first pass over the corpus, then the character n-grams are counted in hashed tables
+    in a second pass, with characters seen less than the threshold converted to an unknown token <unk>
+
+    Args:
+        corpus (iterable): lines from a language corpus, such as a list or a helper.CorpusReader, iterated twice
+        threshold (int): frequency value a character must be seen more than to be included in the vocabulary
+        language (str): name of the language
+        order (int): number of characters in each n-gram
+        hashBits (int): number of bits of the bucket index of the hashed count tables
+
+    Returns:
+        model (engine.HashedNgramModel): n-gram log probabilities and vocabulary for the language corpus
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Creating {0} order {1} character model'.format(language, order))
 
+    # Create a dictionary with character keys and frequency values, adding start and end sentence tokens to each line
+    with instrumentation.stage('countVocabulary', language) as record:
+        unigramFreq = Counter()
+        for line in corpus:
+            unigramFreq.update(tokenize(line, wordModel=False))
+        record.items = sum(unigramFreq.values())
+    unigramFreq, OOV = createOOV(dict(unigramFreq), threshold)
+    vocab = Vocabulary(unigramFreq.keys())
+
+    # Count the character n-grams, out of vocabulary characters map to <unk>
+    counter = HashedNgramCounter(vocab, order, hashBits, wordModel=False)
+    with instrumentation.stage('count', language) as record:
+        counter.update(corpus)
+        record.items = int(counter.ngramCounts.sum())
+    with instrumentation.stage('buildModel', language, items=len(vocab)):
+        model = HashedNgramModel.fromCounter(counter, language)
+    logger.info('{0} order {1} tables hold {2:.1f} MB'.format(language, order, model.nbytes / 2 ** 20))
+    return model
+
+def buildScorer(args, corpora):
+    """ Given the parsed options and the corpus of every language, build the character models and return their scorer
+
+    Args:
+        args (argparse.Namespace): parsed options
+        corpora (dict): a dictionary of language keys and helper.CorpusReader values
+
+    Returns:
+        scorer (scoring.BatchScorer or scoring.HashedNgramScorer): scorer of the languages
+        counters (dict): a dictionary of language keys and engine.NgramCounter values, None for orders above 2
+    """
+    logger = logging.getLogger(__name__)
+    if args.order < 2:
+        parser.error('--order must be at least 2')
+    if args.order > 2 and args.countsPath:
+        parser.error('update and --countsPath are only available for --order 2')
+    if args.order > 2:
+        if args.workers > 1:
+            logger.warning('Corpora are not sharded across workers for --order {0}, each language is counted and built '
+                           'by a single worker'.format(args.order))
+        # Create higher order character models counted in hashed tables
+        arguments = [dict(corpus=corpus, threshold=args.unkThreshold, language=language, order=args.order,
+                          hashBits=args.hashBits) for language, corpus in corpora.items()]
+        models = cli.buildLanguageModels(hashedCharModel, arguments, args.workers)
+        return HashedNgramScorer(models), None
     # Create character models
-    englishCharModel, englishVocab = charModel(englishCorpus, args.unkThreshold, "English")
-    frenchCharModel, frenchVocab = charModel(frenchCorpus, args.unkThreshold, "French")
-    italianCharModel, italianVocab = charModel(italianCorpus, args.unkThreshold, "Italian")
+    return cli.bigramScorer(args, corpora, charModel, wordModel=False)
 
-    # Predict language
-    charResults = predictLanguage(testCorpus, englishCharModel, englishVocab, frenchCharModel, frenchVocab, italianCharModel, italianVocab, wordModel=False)
-    evaluate(charResults, solution)
-    writeResults(charResults, args.outputPath)
+def main(args):
+    cli.main(args, parser, buildScorer)
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
@@ -86,4 +127,6 @@ if __name__ == '__main__':
     logger = logging.getLogger(__name__)
 
     args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    instrumentation.checkArguments(parser, args)
+    with instrumentation.instrumented(args):
+        main(args)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Load generator for server.py.
+
+Opens --concurrency keep-alive connections that each send single line /predict requests back to back, cycling through
+the lines of --testPath, then reports the client side latency percentiles and throughput with the server's /metrics.
+Without --url it starts a server on a free localhost port from --modelPath and runs against it.
+"""
+import json
+import time
+import asyncio
+import logging
+import argparse
+import numpy as np
+
+parser = argparse.ArgumentParser(description='Load generator for the language prediction server')
+parser.add_argument('--url', default=None, help='host:port of a running server, a local server is started if omitted')
+parser.add_argument('--modelPath', default='wordLangId2.model', help='Model file of the local server')
+parser.add_argument('--testPath', default='LangId.test', help='Lines sent as requests')
+parser.add_argument('--concurrency', default=32, type=int, help='Number of concurrent connections')
+parser.add_argument('--requests', default=5000, type=int, help='Total number of requests to send')
+parser.add_argument('--maxBatchSize', default=64, type=int, help='Largest micro-batch of the local server')
+parser.add_argument('--maxWait', default=2.0, type=float, help='Longest micro-batch wait in milliseconds of the local server')
+parser.add_argument('--cacheSize', default=0, type=int, help='Prediction cache size of the local server, 0 disables the cache')
+
+async def request(reader, writer, method, path, payload=None, close=False):
+    """ Send one HTTP request on a keep-alive connection and return the decoded JSON response """
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write('{0} {1} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {2}\r\nConnection: {3}\r\n\r\n'
+                 .format(method, path, len(body), 'close' if close else 'keep-alive').encode('latin-1') + body)
+    await writer.drain()
+    status = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    response = await reader.readexactly(int(headers.get('content-length', 0)))
+    if not status.split()[1:2] == [b'200']:
+        raise RuntimeError('{0} {1} failed: {2}'.format(method, path, response.decode('utf-8')))
+    return json.loads(response)
+
+async def client(host, port, lines, offset, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(count):
+            started = time.perf_counter()
+            await request(reader, writer, 'POST', '/predict', {'text': lines[(offset + i) % len(lines)]})
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def generateLoad(host, port, lines, concurrency, requests):
+    """ Send requests from concurrent connections and return the client side statistics and the server's metrics
+
+    Args:
+        host (str): address of the server
+        port (int): port of the server
+        lines (list): raw lines sent as requests
+        concurrency (int): number of concurrent connections
+        requests (int): total number of requests
+
+    Returns:
+        report (dict): client side latency percentiles and throughput, and the server's /metrics
+    """
+    latencies = []
+    perClient = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, lines, i * 997, count, latencies) for i, count in enumerate(perClient) if count))
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection(host, port)
+    serverMetrics = await request(reader, writer, 'GET', '/metrics', close=True)
+    writer.close()
+    await writer.wait_closed()
+    latencies = np.array(latencies) * 1000
+    return {'requests': len(latencies), 'concurrency': concurrency, 'seconds': elapsed,
+            'requestsPerSecond': len(latencies) / elapsed,
+            'latencyP50Ms': float(np.percentile(latencies, 50)), 'latencyP99Ms': float(np.percentile(latencies, 99)),
+            'server': serverMetrics}
+
+async def runLocal(args, lines):
+    from modelStore import loadScorer
+    from server import PredictionServer
+    from cache import PredictionCache
+
+    cache = PredictionCache(args.cacheSize) if args.cacheSize > 0 else None
+    server = PredictionServer(loadScorer(args.modelPath), args.maxBatchSize, args.maxWait / 1000, cache)
+    ready = asyncio.get_running_loop().create_future()
+    serving = asyncio.create_task(server.serve('127.0.0.1', 0, ready))
+    port = await ready
+    try:
+        return await generateLoad('127.0.0.1', port, lines, args.concurrency, args.requests)
+    finally:
+        serving.cancel()
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+
+def main(args):
+    with open(args.testPath, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        lines = f.read().splitlines()
+    if args.url:
+        host, _, port = args.url.rpartition(':')
+        report = asyncio.run(generateLoad(host, int(port), lines, args.concurrency, args.requests))
+    else:
+        report = asyncio.run(runLocal(args, lines))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    logger = logging.getLogger(__name__)
+
+    args = parser.parse_args()
+    main(args)
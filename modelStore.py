@@ -0,0 +1,191 @@
+"""
+Versioned binary model files that are memory mapped when loaded.
+
+A model file starts with an 8 byte magic string, the format version and the length of a JSON header. The header
+names the languages and describes every array (offset, dtype and shape). The arrays follow, each aligned to 64 bytes,
+and are read as read-only views of a shared memory map, so worker processes loading the same file share its pages.
+"""
+import json
+import mmap
+import struct
+import logging
+import numpy as np
+from engine import NgramCounter
+from scoring import BatchScorer, HashedNgramScorer
+import instrumentation
+
+MAGIC = b'LANGIDM\0'
+VERSION = 3
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<8sII')
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def writeArrays(filepath, header, arrays):
+    """ Write a JSON header and a dictionary of arrays to a model file
+
+    Args:
+        filepath (str): filepath to save the model file
+        header (dict): JSON serializable metadata, the array descriptions are added under 'arrays'
+        arrays (dict): a dictionary of array names and np.ndarray values
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    descriptions = {}
+    offset = 0
+    for name, array in arrays.items():
+        descriptions[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    header = dict(header, arrays=descriptions)
+    headerBytes = json.dumps(header).encode('utf-8')
+    dataStart = _align(PREAMBLE.size + len(headerBytes))
+
+    with open(filepath, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(headerBytes)))
+        f.write(headerBytes)
+        for name, array in arrays.items():
+            f.seek(dataStart + descriptions[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(dataStart + offset)
+
+def readArrays(filepath):
+    """ Memory map a model file and return its header and read-only views of its arrays
+
+    Args:
+        filepath (str): filepath to the model file
+
+    Returns:
+        header (dict): metadata saved with the arrays
+        arrays (dict): a dictionary of array names and np.ndarray values backed by the memory map
+    """
+    with open(filepath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, headerLength = PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('{0} is not a language model file'.format(filepath))
+    if version != VERSION:
+        raise ValueError('{0} has model format version {1}, expected {2}'.format(filepath, version, VERSION))
+    header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + headerLength]).decode('utf-8'))
+    dataStart = _align(PREAMBLE.size + headerLength)
+
+    arrays = {}
+    for name, description in header.pop('arrays').items():
+        dtype = np.dtype(description['dtype'])
+        count = int(np.prod(description['shape'], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=dataStart + description['offset'])
+        arrays[name] = array.reshape(description['shape'])
+    return header, arrays
+
+def encodeTokens(tokens):
+    """ Return the tokens as one newline separated utf-8 byte array, tokens never contain a newline """
+    return np.frombuffer('\n'.join(tokens).encode('utf-8', errors='surrogateescape'), dtype=np.uint8)
+
+def decodeTokens(array):
+    """ Return the list of tokens stored in a byte array by encodeTokens """
+    return array.tobytes().decode('utf-8', errors='surrogateescape').split('\n')
+
+def saveScorer(scorer, filepath):
+    """ Given a scoring.BatchScorer, write its vocabulary, language memberships and log probability tables to a model file
+
+    Args:
+        scorer (scoring.BatchScorer or scoring.HashedNgramScorer): scorer built from the language models
+        filepath (str): filepath to save the model file
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Saving {0} model to {1}'.format(', '.join(scorer.languages), filepath))
+
+    header = {'kind': 'scorer', 'languages': scorer.languages, 'wordModel': scorer.wordModel}
+    if isinstance(scorer, HashedNgramScorer):
+        header.update(kind='hashedScorer', order=scorer.order)
+        arrays = {'tokens': encodeTokens(scorer.vocab.tokens), 'memberBits': scorer.memberBits,
+                  'memberKeys': scorer.memberKeys, 'memberIds': scorer.memberIds, 'logNgrams': scorer.logNgrams,
+                  'logContexts': scorer.logContexts}
+    else:
+        arrays = {'tokens': encodeTokens(scorer.vocab.tokens), 'memberBits': scorer.memberBits,
+                  'unkLogProbs': scorer.unkLogProbs, 'table': scorer.table}
+        if not scorer.dense:
+            arrays['keys'] = scorer.keys
+        if scorer.levels is not None:
+            arrays['levels'] = scorer.levels
+        if scorer.backoffLogProbs is not None:
+            arrays['memberKeys'] = scorer.memberKeys
+            arrays['backoffLogProbs'] = scorer.backoffLogProbs
+            arrays['continuationLogProbs'] = scorer.continuationLogProbs
+    with instrumentation.stage('saveModel', items=len(scorer.languages)):
+        writeArrays(filepath, header, arrays)
+
+def loadScorer(filepath):
+    """ Memory map a model file written by saveScorer and return a scoring.BatchScorer backed by it
+
+    Args:
+        filepath (str): filepath to the model file
+
+    Returns:
+        scorer (scoring.BatchScorer or scoring.HashedNgramScorer): scorer for the saved languages
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Loading model from {0}'.format(filepath))
+
+    with instrumentation.stage('loadModel') as record:
+        header, arrays = readArrays(filepath)
+        record.items = len(header.get('languages', []))
+    if header.get('kind') == 'hashedScorer':
+        return HashedNgramScorer.fromTables(header['languages'], header['wordModel'], header['order'],
+                                            decodeTokens(arrays['tokens']), arrays['memberBits'], arrays['memberKeys'],
+                                            arrays['memberIds'], arrays['logNgrams'], arrays['logContexts'])
+    if header.get('kind') != 'scorer':
+        raise ValueError('{0} does not contain a scoring model'.format(filepath))
+    return BatchScorer.fromTables(header['languages'], header['wordModel'], decodeTokens(arrays['tokens']),
+                                  arrays['memberBits'], arrays['unkLogProbs'], arrays['table'], arrays.get('keys'),
+                                  arrays.get('levels'), arrays.get('memberKeys'), arrays.get('backoffLogProbs'),
+                                  arrays.get('continuationLogProbs'))
+
+def saveCounters(counters, filepath):
+    """ Given a dictionary of language names and engine.NgramCounter values, write the raw counts to a counts file
+
+    Args:
+        counters (dict): a dictionary of language keys and engine.NgramCounter values
+        filepath (str): filepath to save the counts file
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Saving {0} counts to {1}'.format(', '.join(counters), filepath))
+
+    wordModels = {counter.wordModel for counter in counters.values()}
+    header = {'kind': 'counts', 'languages': list(counters), 'wordModel': wordModels.pop(),
+              'positions': [counter.position for counter in counters.values()]}
+    arrays = {}
+    for language, counter in counters.items():
+        arrays[language + '/tokens'] = encodeTokens(counter.tokens)
+        arrays[language + '/unigrams'] = counter.unigrams
+        arrays[language + '/keys'] = counter.keys
+        arrays[language + '/freqs'] = counter.freqs
+        arrays[language + '/firstSeen'] = counter.firstSeen
+    writeArrays(filepath, header, arrays)
+
+def loadCounters(filepath):
+    """ Load a counts file written by saveCounters so more text can be folded into the counts
+
+    Args:
+        filepath (str): filepath to the counts file
+
+    Returns:
+        counters (dict): a dictionary of language keys and engine.NgramCounter values
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Loading counts from {0}'.format(filepath))
+
+    header, arrays = readArrays(filepath)
+    if header.get('kind') != 'counts':
+        raise ValueError('{0} does not contain n-gram counts'.format(filepath))
+    counters = {}
+    for language, position in zip(header['languages'], header['positions']):
+        counter = NgramCounter(header['wordModel'])
+        tokens = decodeTokens(arrays[language + '/tokens']) if len(arrays[language + '/tokens']) else []
+        counter.index = {token: i for i, token in enumerate(tokens)}
+        counter.unigrams = np.array(arrays[language + '/unigrams'])
+        counter.keys = np.array(arrays[language + '/keys'])
+        counter.freqs = np.array(arrays[language + '/freqs'])
+        counter.firstSeen = np.array(arrays[language + '/firstSeen'])
+        counter.position = position
+        counters[language] = counter
+    return counters
@@ -0,0 +1,149 @@
+"""
+Multi-process training and prediction.
+
+Counting is sharded by handing batches of lines to a pool of processes, each returning an engine.NgramCounter that
+is merged into its language's counts in corpus order, so the merged counts match a single process count exactly.
+Shards of every language are in flight together, so the languages are also counted in parallel, and the models of
+the languages are then built from the merged counts in a pool with one task per language. Prediction scores
+batches of lines in a pool whose processes each hold the scorer, and results are returned in input order. Every task
+returns the totals of the instrumented stages it ran, which are merged into the parent process's measurements.
+"""
+import os
+import logging
+import multiprocessing
+from collections import deque
+from engine import NgramCounter
+from helper import iterBatches
+import instrumentation
+
+def _countShard(language, wordModel, lines):
+    with instrumentation.stage('count', language) as record:
+        counter = NgramCounter(wordModel)
+        counter.update(lines)
+        record.items = counter.position
+    return counter
+
+def countCorpora(corpora, counters, workers, shardSize=20000):
+    """ Count several corpora across a pool of processes and fold the counts into each language's counter
+
+    Args:
+        corpora (dict): a dictionary of language keys and corpus values, such as lists or helper.CorpusReader objects
+        counters (dict): a dictionary of language keys and engine.NgramCounter values the counts are merged into
+        workers (int): number of processes
+        shardSize (int): number of lines counted by a process at a time
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Counting {0} corpora with {1} workers'.format(', '.join(corpora), workers))
+
+    settings = instrumentation.workerSettings()
+    ready = {language: [] for language in corpora}
+    def fold(language, result, final=False):
+        # Merge shard counts a few at a time, each merge sorts only the shards and copies the language's table once
+        if result is not None:
+            counter, stages = result
+            instrumentation.mergeStages(stages)
+            ready[language].append(counter)
+        if ready[language] and (final or len(ready[language]) >= workers):
+            counters[language].merge(ready[language])
+            ready[language] = []
+
+    with instrumentation.stage('countParallel') as record, multiprocessing.Pool(workers) as pool:
+        # Keep a bounded number of shards in flight and merge them in the order they were read
+        pending = deque()
+        record.items = 0
+        for language, corpus in corpora.items():
+            wordModel = counters[language].wordModel
+            for shard in iterBatches(corpus, shardSize):
+                record.items += len(shard)
+                pending.append((language, pool.apply_async(instrumentation.runInWorker,
+                                                           (settings, _countShard, language, wordModel, shard))))
+                while len(pending) > 2 * workers:
+                    doneLanguage, result = pending.popleft()
+                    fold(doneLanguage, result.get())
+        while pending:
+            doneLanguage, result = pending.popleft()
+            fold(doneLanguage, result.get())
+        for language in corpora:
+            fold(language, None, final=True)
+
+def buildModels(builder, arguments, workers):
+    """ Build the model of every language across a pool of processes, one language per task
+
+    Args:
+        builder (function): module level function building one language's model, such as wordLangId2.wordModel
+        arguments (list): a dictionary of the builder's keyword arguments for each language
+        workers (int): number of processes
+
+    Returns:
+        models (list): model built from each language's arguments, in the order of the arguments
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Building {0} models with {1} workers'.format(len(arguments), workers))
+
+    settings = instrumentation.workerSettings()
+    models = []
+    with instrumentation.stage('buildParallel', items=len(arguments)), \
+            multiprocessing.Pool(max(min(workers, len(arguments)), 1)) as pool:
+        results = [pool.apply_async(instrumentation.runInWorker, (settings, builder), kwargs) for kwargs in arguments]
+        for result in results:
+            model, stages = result.get()
+            instrumentation.mergeStages(stages)
+            models.append(model)
+    return models
+
+_scorer = None
+_options = (None, None, None)
+_settings = None
+
+def _initScorer(scorer, options, settings):
+    global _scorer, _options, _settings
+    _scorer = scorer
+    _options = options
+    _settings = settings
+
+def _predictBatch(lines):
+    cache = _options[2]
+    if cache is None:
+        predictions, stages = instrumentation.runInWorker(_settings, _scorer.predict, lines, *_options)
+        return predictions, None, stages
+    counters = (cache.hits, cache.misses, cache.evictions)
+    predictions, stages = instrumentation.runInWorker(_settings, _scorer.predict, lines, *_options)
+    # Report what the batch added to this process's copy of the cache, and how many lines the copy holds
+    return predictions, (os.getpid(), cache.hits - counters[0], cache.misses - counters[1],
+                         cache.evictions - counters[2], len(cache)), stages
+
+def predictParallel(testCorpus, scorer, workers, batchSize=1024, pruneMargin=None, decisiveMargin=None, cache=None):
+    """ Given the test corpus and a scorer, predict the language of each line with a pool of processes
+
+    Args:
+        testCorpus (iterable): lines from the test corpus, such as a list or a helper.CorpusReader
+        scorer (scoring.BatchScorer): scorer built from the language models or loaded from a model file
+        workers (int): number of processes
+        batchSize (int): number of lines scored by a process at a time
+        pruneMargin (float): early exit prune margin, see scoring.BatchScorer.scoreEarlyExit
+        decisiveMargin (float): early exit decisive margin, see scoring.BatchScorer.scoreEarlyExit
+        cache (cache.PredictionCache): cache of line scores, copied into every process, the counters of the copies
+            are merged back into it
+
+    Returns:
+        results (list): prediction for each line in the test corpus, in input order
+    """
+    logger = logging.getLogger(__name__)
+    logger.info('Predicting languages with {0} workers'.format(workers))
+
+    results = []
+    counters = [0, 0, 0]
+    sizes = {}
+    initargs = (scorer, (pruneMargin, decisiveMargin, cache), instrumentation.workerSettings())
+    with multiprocessing.Pool(workers, initializer=_initScorer, initargs=initargs) as pool:
+        for predictions, cacheStats, stages in pool.imap(_predictBatch, iterBatches(testCorpus, batchSize)):
+            results.extend(predictions)
+            instrumentation.mergeStages(stages)
+            if cacheStats is not None:
+                pid, hits, misses, evictions, size = cacheStats
+                counters = [sum(pair) for pair in zip(counters, (hits, misses, evictions))]
+                sizes[pid] = size
+    if cache is not None:
+        logger.info('The {0} workers each kept their own prediction cache of up to {1} lines'.format(workers, cache.maxSize))
+        cache.mergeStats(*counters, size=sum(sizes.values()))
+    return results
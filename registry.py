@@ -0,0 +1,80 @@
+"""
+Registry of the languages to identify and the training corpus of each one.
+
+Languages come from a directory of training corpora named <prefix><Language>, such as LangId.train.English, or from
+a manifest file listing one language and corpus path per line. Without either, the three bundled languages are used.
+"""
+import os
+import logging
+
+DEFAULT_PREFIX = 'LangId.train.'
+
+def discoverCorpora(trainDir, prefix=DEFAULT_PREFIX):
+    """ Given a directory, return the training corpus of every language found in it
+
+    Args:
+        trainDir (str): directory holding files named <prefix><Language>
+        prefix (str): file name prefix of the training corpora
+
+    Returns:
+        corpora (dict): a dictionary of language keys and corpus path values, sorted by language
+    """
+    corpora = {}
+    for filename in sorted(os.listdir(trainDir)):
+        path = os.path.join(trainDir, filename)
+        if filename.startswith(prefix) and len(filename) > len(prefix) and os.path.isfile(path):
+            corpora[filename[len(prefix):]] = path
+    if not corpora:
+        raise ValueError('No {0}<Language> training corpora found in {1}'.format(prefix, trainDir))
+    return corpora
+
+def readManifest(filepath):
+    """ Given a manifest file, return the training corpus of every language it lists
+
+    Each line holds a language name and the path of its corpus separated by whitespace, relative paths are resolved
+    against the directory of the manifest. Blank lines and lines starting with # are ignored.
+
+    Args:
+        filepath (str): filepath to the manifest
+
+    Returns:
+        corpora (dict): a dictionary of language keys and corpus path values, in manifest order
+    """
+    baseDir = os.path.dirname(os.path.abspath(filepath))
+    corpora = {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for lineNumber, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split(None, 1)
+            if len(fields) != 2:
+                raise ValueError('{0}:{1}: expected a language and a corpus path'.format(filepath, lineNumber))
+            language, path = fields
+            if language in corpora:
+                raise ValueError('{0}:{1}: {2} is listed twice'.format(filepath, lineNumber, language))
+            corpora[language] = os.path.join(baseDir, path)
+    if not corpora:
+        raise ValueError('{0} does not list any languages'.format(filepath))
+    return corpora
+
+def languageCorpora(args):
+    """ Given the parsed command line arguments, return the training corpus of every language to identify
+
+    --manifest takes precedence over --trainDir, which takes precedence over --englishPath/--frenchPath/--italianPath.
+
+    Args:
+        args (argparse.Namespace): parsed arguments of one of the language model scripts
+
+    Returns:
+        corpora (dict): a dictionary of language keys and corpus path values
+    """
+    logger = logging.getLogger(__name__)
+    if args.manifest:
+        corpora = readManifest(args.manifest)
+    elif args.trainDir:
+        corpora = discoverCorpora(args.trainDir)
+    else:
+        corpora = {'English': args.englishPath, 'French': args.frenchPath, 'Italian': args.italianPath}
+    logger.info('Registered {0} languages: {1}'.format(len(corpora), ', '.join(corpora)))
+    return corpora
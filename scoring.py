@@ -0,0 +1,549 @@
+"""
+Vectorized batch scoring of test lines against several language models at once.
+
+All languages share one vocabulary of token ids and one table of log probabilities, so scoring a batch of lines
+is a handful of NumPy gathers and sums that produce an N x L matrix of line log probabilities. Higher order models
+are scored the same way from their hashed tables.
+"""
+import logging
+import numpy as np
+from engine import Vocabulary, tokenize, hashNgrams
+
+def memberTables(sharedIds, V):
+    """ Given the shared ids of each language's own tokens, record which shared tokens each language has seen
+
+    Args:
+        sharedIds (list): shared id of each token of each language's vocabulary, indexed by the language's own ids
+        V (int): size of the shared vocabulary
+
+    Returns:
+        memberBits (np.ndarray): L x V bitset of the shared tokens each language has seen, packed little endian
+        memberKeys (np.ndarray): sorted (language, token) keys l * V + id of the shared tokens each language has seen
+        memberIds (np.ndarray): each language's own id of the token of each member key
+    """
+    L = len(sharedIds)
+    memberBits = np.zeros((L, (V + 7) // 8), dtype=np.uint8)
+    memberKeys = []
+    memberIds = []
+    for l, ids in enumerate(sharedIds):
+        seen = np.zeros(V, dtype=bool)
+        seen[ids] = True
+        memberBits[l] = np.packbits(seen, bitorder='little')
+        order = np.argsort(ids, kind='stable')
+        memberKeys.append(l * V + ids[order])
+        memberIds.append(order)
+    memberKeys = np.concatenate(memberKeys).astype(np.int32 if L * V < 2 ** 31 else np.int64)
+    return memberBits, memberKeys, np.concatenate(memberIds).astype(np.int32)
+
+class BatchScorer:
+    """ Scores batches of lines against a set of bigram language models
+
+    Every language's bigram log probabilities are stored against a vocabulary shared by all languages. Which shared
+    tokens each language has seen is kept as an L x V bitset, and tokens that are outside of a language's own
+    vocabulary are mapped to <unk> for that language. Bigrams a language has not seen fall back to the language's
+    (<unk>, <unk>) log probability, or to its backoff and continuation log probabilities as in engine.BigramModel,
+    stored for each of its own tokens against one sorted array of (language, token) keys, l * V + id. Small
+    vocabularies are stored as a dense L x V x V table. Large ones are stored as one fused sorted table of (language,
+    bigram) ids, l * V * V + id1 * V + id2, holding only the bigrams each language has seen, so one search scores all
+    languages.
+
+    Args:
+        models (list): an engine.BigramModel for each language
+        maxDenseSize (int): largest L x V x V table stored densely
+    """
+    order = 2
+
+    def __init__(self, models, maxDenseSize=1 << 24):
+        logger = logging.getLogger(__name__)
+        self.languages = [model.language for model in models]
+        logger.info('Building scoring tables for {0}'.format(', '.join(self.languages)))
+
+        wordModels = {model.wordModel for model in models}
+        if len(wordModels) != 1:
+            raise ValueError('Character and word models cannot be scored together')
+        self.wordModel = wordModels.pop()
+        tokens = {}
+        for model in models:
+            tokens.update(dict.fromkeys(model.vocab.tokens))
+        self.vocab = Vocabulary(tokens)
+        V = len(self.vocab)
+        L = len(self.languages)
+
+        # Record which shared tokens each language has seen as one bit per token, tokens it has not seen go to <unk>
+        sharedIds = [np.array([self.vocab.lookup(token) for token in model.vocab.tokens], dtype=np.int64)
+                     for model in models]
+        self.memberBits, memberKeys, memberIds = memberTables(sharedIds, V)
+        self.unkLogProbs = np.array([model.unkLogProb for model in models])
+        # Backoff arrays are stored for each language's own tokens in the order of the sorted (language, token) keys,
+        # languages without them back off to their (<unk>, <unk>) log probability plus nothing
+        self.memberKeys = None
+        self.backoffLogProbs = None
+        self.continuationLogProbs = None
+        if any(model.backoffLogProbs is not None for model in models):
+            self.memberKeys = memberKeys
+            sizes = [len(ids) for ids in sharedIds]
+            positions = np.repeat(np.cumsum([0] + sizes[:-1]), sizes) + memberIds
+            self.backoffLogProbs = np.concatenate([np.full(len(model.vocab), model.unkLogProb)
+                                                   if model.backoffLogProbs is None else model.backoffLogProbs
+                                                   for model in models])[positions]
+            self.continuationLogProbs = np.concatenate([np.zeros(len(model.vocab))
+                                                        if model.continuationLogProbs is None else model.continuationLogProbs
+                                                        for model in models])[positions]
+
+        self.dense = L * V * V <= maxDenseSize and all(model.dense for model in models)
+        if self.dense:
+            self.table = np.empty((L, V * V))
+            for l, model in enumerate(models):
+                localIds = np.full(V, model.vocab.unkId, dtype=np.int64)
+                localIds[sharedIds[l]] = np.arange(len(sharedIds[l]))
+                self.table[l] = model.table[np.ix_(localIds, localIds)].reshape(-1)
+            self.keys = None
+        else:
+            bigramKeys = []
+            bigramLogProbs = []
+            for l, model in enumerate(models):
+                ids1, ids2, logProbs = model.seenBigrams()
+                bigramKeys.append(sharedIds[l][ids1] * V + sharedIds[l][ids2])
+                bigramLogProbs.append(logProbs)
+            # Languages are laid out one after the other, so the fused keys are sorted once each language's are
+            fusedKeys = np.concatenate([l * V * V + keys for l, keys in enumerate(bigramKeys)])
+            order = np.argsort(fusedKeys, kind='stable')
+            self.keys = fusedKeys[order]
+            self.table = np.concatenate(bigramLogProbs)[order]
+        self.levels = None
+        logger.info('Scoring tables hold {0:.1f} MB'.format(self.nbytes / 2 ** 20))
+
+    @classmethod
+    def fromTables(cls, languages, wordModel, tokens, memberBits, unkLogProbs, table, keys=None, levels=None,
+                   memberKeys=None, backoffLogProbs=None, continuationLogProbs=None):
+        """ Build a scorer directly from its tables, such as those loaded by modelStore.loadScorer
+
+        Args:
+            languages (list): names of the languages
+            wordModel (bool): true if the models are word models and false if they are character models
+            tokens (list): shared vocabulary, including <unk>
+            memberBits (np.ndarray): L x V bitset of the shared tokens each language has seen, packed little endian
+            unkLogProbs (np.ndarray): (<unk>, <unk>) log probability of each language
+            table (np.ndarray): L x V * V dense table or fused table of bigram log probabilities
+            keys (np.ndarray): sorted fused (language, bigram) ids of a fused table, None for a dense table
+            levels (np.ndarray): log probability of each code of a quantized table, None for a float table
+            memberKeys (np.ndarray): sorted (language, token) keys l * V + id the backoff arrays are stored for, or None
+            backoffLogProbs (np.ndarray): log backoff weight of each member key as the first token of unseen bigrams, or None
+            continuationLogProbs (np.ndarray): log probability of each member key as the second token of unseen bigrams, or None
+
+        Returns:
+            scorer (BatchScorer): the scorer
+        """
+        scorer = cls.__new__(cls)
+        scorer.languages = list(languages)
+        scorer.wordModel = wordModel
+        scorer.vocab = Vocabulary(tokens)
+        scorer.memberBits = memberBits
+        scorer.unkLogProbs = unkLogProbs
+        scorer.table = table
+        scorer.keys = keys
+        scorer.dense = keys is None
+        scorer.levels = levels
+        scorer.memberKeys = memberKeys
+        scorer.backoffLogProbs = backoffLogProbs
+        scorer.continuationLogProbs = continuationLogProbs
+        return scorer
+
+    @property
+    def nbytes(self):
+        """ Size of the scoring tables in bytes """
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def quantize(self, bits):
+        """ Replace the log probabilities of the table with bits bit codes of evenly spaced levels
+
+        The levels span the smallest to the largest log probability of the table, so each log probability moves by
+        at most half a level. The (<unk>, <unk>) fallback log probabilities are kept exactly.
+
+        Args:
+            bits (int): 8 or 16
+        """
+        logger = logging.getLogger(__name__)
+        if bits not in (8, 16):
+            raise ValueError('Log probabilities can only be quantized to 8 or 16 bits')
+        values = self.logProbs(self.table)
+        low = float(values.min()) if values.size else 0.0
+        high = float(values.max()) if values.size else 0.0
+        self.levels = np.linspace(low, high, 1 << bits)
+        step = (high - low) / ((1 << bits) - 1) or 1.0
+        self.table = np.rint((values - low) / step).astype(np.uint8 if bits == 8 else np.uint16)
+        logger.info('Quantized log probabilities to {0} bits, scoring tables hold {1:.1f} MB'.format(bits, self.nbytes / 2 ** 20))
+
+    def logProbs(self, values):
+        """ Return the log probabilities stored as values of the table, decoding them if the table is quantized """
+        return values if self.levels is None else self.levels[values]
+
+    def mapTokens(self, languages, ids):
+        """ Given language indices and shared token ids, map the tokens each language has not seen to <unk>
+
+        Args:
+            languages (np.ndarray): index of the language of each token, broadcast against the ids
+            ids (np.ndarray): shared token ids
+
+        Returns:
+            mapped (np.ndarray): shared id of each token, or the shared <unk> id if its language has not seen it
+        """
+        seen = (self.memberBits[languages, ids >> 3] >> (ids & 7).astype(np.uint8)) & 1
+        return np.where(seen.astype(bool), ids, self.vocab.unkId)
+
+    def memberPositions(self, languages, ids):
+        """ Given language indices and shared token ids seen by those languages, return the position of their keys
+
+        Args:
+            languages (np.ndarray): index of the language of each token, broadcast against the ids
+            ids (np.ndarray): shared token ids mapped by mapTokens
+
+        Returns:
+            positions (np.ndarray): position of the (language, token) key of each token in memberKeys
+        """
+        return np.searchsorted(self.memberKeys, languages * len(self.vocab) + ids)
+
+    def unseenLogProbs(self, languages, ids1, ids2):
+        """ Given language indices and the shared ids mapped by mapTokens of bigrams, return their unseen log probabilities
+
+        Args:
+            languages (np.ndarray): index of the language of each bigram, broadcast against the ids
+            ids1 (np.ndarray): mapped shared ids of the first token of each bigram
+            ids2 (np.ndarray): mapped shared ids of the second token of each bigram
+
+        Returns:
+            logProbs (np.ndarray): log probability of each bigram if its language has not seen it
+        """
+        if self.backoffLogProbs is None:
+            return self.unkLogProbs[languages]
+        return (self.backoffLogProbs[self.memberPositions(languages, ids1)] +
+                self.continuationLogProbs[self.memberPositions(languages, ids2)])
+
+    def bigramLogProbs(self, ids1, ids2):
+        """ Given the shared ids of the tokens of B bigrams, return the log probability of each bigram in each language
+
+        Args:
+            ids1 (np.ndarray): shared ids of the first token of each bigram
+            ids2 (np.ndarray): shared ids of the second token of each bigram
+
+        Returns:
+            logProbs (np.ndarray): L x B matrix of bigram log probabilities
+        """
+        V = len(self.vocab)
+        languages = np.arange(len(self.languages))[:, None]
+        mapped1 = self.mapTokens(languages, ids1[None, :])
+        mapped2 = self.mapTokens(languages, ids2[None, :])
+        keys = mapped1 * V + mapped2
+        if self.dense:
+            return self.logProbs(np.take_along_axis(self.table, keys, axis=1))
+        unseen = np.broadcast_to(self.unseenLogProbs(languages, mapped1, mapped2), keys.shape)
+        if len(self.keys) == 0:
+            return unseen.copy()
+        keys += languages * V * V
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        return np.where(found, self.logProbs(self.table[positions]), unseen)
+
+    def ngramLogProbs(self, ids):
+        """ Given the shared ids of the tokens of B n-grams, return the log probability of each n-gram in each language
+
+        Args:
+            ids (np.ndarray): B x order matrix of shared token ids
+
+        Returns:
+            logProbs (np.ndarray): L x B matrix of n-gram log probabilities
+        """
+        return self.bigramLogProbs(ids[:, 0], ids[:, 1])
+
+    def pairLogProbs(self, languages, ids):
+        """ Given B (language, n-gram) pairs, return the log probability of each n-gram in its language
+
+        Args:
+            languages (np.ndarray): index of the language each n-gram is scored in
+            ids (np.ndarray): B x order matrix of shared token ids
+
+        Returns:
+            logProbs (np.ndarray): log probability of each n-gram
+        """
+        V = len(self.vocab)
+        mapped1 = self.mapTokens(languages, ids[:, 0])
+        mapped2 = self.mapTokens(languages, ids[:, 1])
+        keys = mapped1 * V + mapped2
+        if self.dense:
+            return self.logProbs(self.table[languages, keys])
+        unseen = self.unseenLogProbs(languages, mapped1, mapped2)
+        if len(self.keys) == 0:
+            return unseen
+        keys += languages * V * V
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.logProbs(self.table[positions]), unseen)
+
+    def encodeLines(self, lines):
+        """ Given cleaned lines, return their shared token ids laid end to end and the length of each line
+
+        Args:
+            lines (list): cleaned lines to encode
+
+        Returns:
+            ids (np.ndarray): token ids of all the lines, one line after the other
+            lengths (np.ndarray): number of tokens in each line
+        """
+        index = self.vocab.index
+        unkId = self.vocab.unkId
+        tokenized = [tokenize(line, self.wordModel, self.order) for line in lines]
+        lengths = np.fromiter((len(tokens) for tokens in tokenized), dtype=np.int64, count=len(lines))
+        ids = np.fromiter((index.get(token, unkId) for tokens in tokenized for token in tokens),
+                          dtype=np.int64, count=int(lengths.sum()))
+        return ids, lengths
+
+    def scoreEarlyExit(self, lines, pruneMargin=10.0, decisiveMargin=20.0, blockSize=16):
+        """ Given a batch of cleaned lines, score each line incrementally and stop once its language is clear
+
+        N-grams are scored blockSize positions at a time. After each block, a language whose running log probability
+        is more than pruneMargin behind the leader stops being scored, and a line stops once only one language is
+        left or the leader is ahead of every remaining language by decisiveMargin. With infinite margins every
+        n-gram is scored and the scores equal those of score.
+
+        Args:
+            lines (list): cleaned lines to score
+            pruneMargin (float): log probability gap behind the leader at which a language is dropped
+            decisiveMargin (float): log probability lead over every remaining language at which a line stops
+            blockSize (int): number of n-gram positions scored between checks
+
+        Returns:
+            scores (np.ndarray): N x L matrix of log probabilities of the scored prefix of each line, -inf for
+                languages dropped from a line
+            consumed (np.ndarray): number of n-grams of each line scored before it stopped
+            margins (np.ndarray): final lead of the predicted language over the runner up still being scored when
+                the line stopped, inf when the runner up was dropped by the last check
+        """
+        N = len(lines)
+        L = len(self.languages)
+        if N == 0:
+            return np.zeros((0, L)), np.zeros(0, dtype=np.int64), np.zeros(0)
+        ids, lengths = self.encodeLines(lines)
+        starts = np.cumsum(lengths) - lengths
+        ngramCounts = np.maximum(lengths - (self.order - 1), 0)
+        totals = np.zeros((N, L))
+        alive = np.ones((N, L), dtype=bool)
+        consumed = np.zeros(N, dtype=np.int64)
+        margins = np.full(N, np.inf)
+        active = np.arange(N)
+
+        for start in range(0, int(ngramCounts.max()), blockSize):
+            stop = start + blockSize
+            # Score the block for the languages still alive in each active line, position by position
+            positions = np.arange(start, stop)
+            valid = positions[None, :] < ngramCounts[active, None]
+            rows, languages, offsets = np.nonzero(alive[active][:, :, None] & valid[:, None, :])
+            lineIds = active[rows]
+            values = np.zeros((len(active), L, blockSize))
+            windows = ids[(starts[lineIds] + start + offsets)[:, None] + np.arange(self.order)]
+            values[rows, languages, offsets] = self.pairLogProbs(languages, windows)
+            blockTotals = totals[active]
+            for offset in range(blockSize):
+                blockTotals += values[:, :, offset]
+            totals[active] = blockTotals
+            consumed[active] = np.minimum(ngramCounts[active], stop)
+
+            # Drop the languages that fell behind and stop the lines that are decided or fully scored
+            running = np.where(alive[active], blockTotals, -np.inf)
+            leader = running.max(axis=1)
+            runnerUp = np.sort(running, axis=1)[:, -2] if L > 1 else np.full(len(active), -np.inf)
+            margins[active] = leader - runnerUp
+            alive[active] &= running >= (leader - pruneMargin)[:, None]
+            done = (alive[active].sum(axis=1) == 1) | (margins[active] >= decisiveMargin) | (consumed[active] == ngramCounts[active])
+            active = active[~done]
+            if len(active) == 0:
+                break
+        return np.where(alive, totals, -np.inf), consumed, margins
+
+    def score(self, lines):
+        """ Given a batch of cleaned lines, return the log probability of each line in each language
+
+        N-gram log probabilities are summed per line with np.bincount, which adds them in input order, so each line's
+        total is accumulated left to right in the same order as helper.calcLangProbs and memory grows with the number
+        of n-grams rather than with the longest line.
+
+        Args:
+            lines (list): cleaned lines to score
+
+        Returns:
+            scores (np.ndarray): N x L matrix of line log probabilities
+        """
+        N = len(lines)
+        L = len(self.languages)
+        if N == 0:
+            return np.zeros((0, L))
+        ids, lengths = self.encodeLines(lines)
+
+        # Every token with a full context in its line ends an n-gram, record the line and position of each one
+        context = self.order - 1
+        starts = np.cumsum(lengths) - lengths
+        lineIds = np.repeat(np.arange(N), lengths)
+        positions = np.arange(len(ids)) - starts[lineIds]
+        ends = np.nonzero(positions >= context)[0]
+        logProbs = self.ngramLogProbs(ids[ends[:, None] + np.arange(-context, 1)])
+
+        scores = np.empty((N, L))
+        for l in range(L):
+            scores[:, l] = np.bincount(lineIds[ends], weights=logProbs[l], minlength=N)
+        return scores
+
+    def earlyExitRows(self, lines, pruneMargin=None, decisiveMargin=None):
+        """ Given a batch of cleaned lines, return the results of scoreEarlyExit as one row per line
+
+        Args:
+            lines (list): cleaned lines to score
+            pruneMargin (float): log probability gap behind the leader at which a language is dropped, None never drops
+            decisiveMargin (float): log probability lead at which a line stops, None never stops early
+
+        Returns:
+            rows (np.ndarray): N x (L + 2) matrix of the scores of each line followed by the number of n-grams
+                scored and the final margin, as returned by scoreEarlyExit
+        """
+        pruneMargin = np.inf if pruneMargin is None else pruneMargin
+        decisiveMargin = np.inf if decisiveMargin is None else decisiveMargin
+        scores, consumed, margins = self.scoreEarlyExit(lines, pruneMargin, decisiveMargin)
+        return np.column_stack([scores, consumed, margins])
+
+    def scoreBatch(self, lines, pruneMargin=None, decisiveMargin=None, cache=None, details=False):
+        """ Given a batch of cleaned lines, return their per-language log probabilities as predict scores them
+
+        Args:
+            lines (list): cleaned lines to score
+            pruneMargin (float): score lines with scoreEarlyExit and this prune margin, None never drops a language
+            decisiveMargin (float): score lines with scoreEarlyExit and this decisive margin, None never stops early
+            cache (cache.PredictionCache): cache of line scores consulted before scoring, None scores every line
+            details (bool): also return how far early exit scored each line
+
+        Returns:
+            scores (np.ndarray): N x L matrix of log probabilities, -inf for languages dropped by early exit
+            consumed (np.ndarray): only with details, number of n-grams of each line scored before it stopped, None
+                without early exit
+            margins (np.ndarray): only with details, final lead of the prediction over the runner up still being
+                scored, None without early exit
+        """
+        earlyExit = pruneMargin is not None or decisiveMargin is not None
+        if earlyExit:
+            # Cached rows hold the early exit details after the scores, so cache hits report them too
+            scoreLines = lambda batch: self.earlyExitRows(batch, pruneMargin, decisiveMargin)
+        else:
+            scoreLines = self.score
+        rows = scoreLines(lines) if cache is None else cache.score(lines, scoreLines)
+        if not earlyExit:
+            return (rows, None, None) if details else rows
+        L = len(self.languages)
+        if not details:
+            return rows[:, :L]
+        return rows[:, :L], rows[:, L].astype(np.int64), rows[:, L + 1]
+
+    def predict(self, lines, pruneMargin=None, decisiveMargin=None, cache=None):
+        """ Given a batch of cleaned lines, return the most likely language of each line
+
+        Args:
+            lines (list): cleaned lines to classify
+            pruneMargin (float): score lines with scoreEarlyExit and this prune margin, None never drops a language
+            decisiveMargin (float): score lines with scoreEarlyExit and this decisive margin, None never stops early
+            cache (cache.PredictionCache): cache of line scores consulted before scoring, None scores every line
+
+        Returns:
+            results (list): prediction for each line
+        """
+        best = np.argmax(self.scoreBatch(lines, pruneMargin, decisiveMargin, cache), axis=1)
+        return [self.languages[i] for i in best.tolist()]
+
+class HashedNgramScorer(BatchScorer):
+    """ Scores batches of lines against a set of order N language models backed by hashed tables
+
+    Shared token ids are mapped to the ids each language counted its n-grams with, tokens outside of a language's
+    vocabulary going to its <unk>, and each n-gram is scored from the language's log tables as in
+    engine.HashedNgramModel. Early exit scoring and prediction work as for bigram models.
+
+    Args:
+        models (list): an engine.HashedNgramModel for each language, all of the same order and table size
+    """
+    def __init__(self, models):
+        logger = logging.getLogger(__name__)
+        self.languages = [model.language for model in models]
+        logger.info('Building order {0} scoring tables for {1}'.format(models[0].order, ', '.join(self.languages)))
+
+        if len({(model.wordModel, model.order, model.hashBits) for model in models}) != 1:
+            raise ValueError('Only models of the same kind, order and table size can be scored together')
+        self.wordModel = models[0].wordModel
+        self.order = models[0].order
+        self.hashBits = models[0].hashBits
+        tokens = {}
+        for model in models:
+            tokens.update(dict.fromkeys(model.vocab.tokens))
+        self.vocab = Vocabulary(tokens)
+
+        # Record which shared tokens each language has seen, tokens it has not seen go to <unk>, and the id the
+        # language hashed each of its own tokens with
+        sharedIds = [np.array([self.vocab.lookup(token) for token in model.vocab.tokens], dtype=np.int64)
+                     for model in models]
+        self.memberBits, self.memberKeys, self.memberIds = memberTables(sharedIds, len(self.vocab))
+        self.logNgrams = np.stack([model.logNgrams for model in models])
+        self.logContexts = np.stack([model.logContexts for model in models])
+
+    @classmethod
+    def fromTables(cls, languages, wordModel, order, tokens, memberBits, memberKeys, memberIds, logNgrams, logContexts):
+        """ Build a scorer directly from its tables, such as those loaded by modelStore.loadScorer
+
+        Args:
+            languages (list): names of the languages
+            wordModel (bool): true if the models are word models and false if they are character models
+            order (int): number of tokens in each n-gram
+            tokens (list): shared vocabulary, including <unk>
+            memberBits (np.ndarray): L x V bitset of the shared tokens each language has seen, packed little endian
+            memberKeys (np.ndarray): sorted (language, token) keys l * V + id of the shared tokens each language has seen
+            memberIds (np.ndarray): id each language hashed the token of each member key with
+            logNgrams (np.ndarray): L x 2 ** hashBits table of log n-gram counts
+            logContexts (np.ndarray): L x 2 ** hashBits table of log context counts
+
+        Returns:
+            scorer (HashedNgramScorer): the scorer
+        """
+        scorer = cls.__new__(cls)
+        scorer.languages = list(languages)
+        scorer.wordModel = wordModel
+        scorer.order = order
+        scorer.hashBits = int(logNgrams.shape[1]).bit_length() - 1
+        scorer.vocab = Vocabulary(tokens)
+        scorer.memberBits = memberBits
+        scorer.memberKeys = memberKeys
+        scorer.memberIds = memberIds
+        scorer.logNgrams = logNgrams
+        scorer.logContexts = logContexts
+        return scorer
+
+    def ngramLogProbs(self, ids):
+        """ Given the shared ids of the tokens of B n-grams, return the log probability of each n-gram in each language
+
+        Args:
+            ids (np.ndarray): B x order matrix of shared token ids
+
+        Returns:
+            logProbs (np.ndarray): L x B matrix of n-gram log probabilities
+        """
+        languages = np.arange(len(self.languages))[:, None, None]
+        local = self.memberIds[self.memberPositions(languages, self.mapTokens(languages, ids[None]))]
+        ngrams = np.take_along_axis(self.logNgrams, hashNgrams(local, self.hashBits), axis=1)
+        contexts = np.take_along_axis(self.logContexts, hashNgrams(local[..., :-1], self.hashBits), axis=1)
+        return ngrams.astype(np.float64) - contexts
+
+    def pairLogProbs(self, languages, ids):
+        """ Given B (language, n-gram) pairs, return the log probability of each n-gram in its language
+
+        Args:
+            languages (np.ndarray): index of the language each n-gram is scored in
+            ids (np.ndarray): B x order matrix of shared token ids
+
+        Returns:
+            logProbs (np.ndarray): log probability of each n-gram
+        """
+        rows = languages[:, None]
+        local = self.memberIds[self.memberPositions(rows, self.mapTokens(rows, ids))]
+        ngrams = self.logNgrams[languages, hashNgrams(local, self.hashBits)]
+        contexts = self.logContexts[languages, hashNgrams(local[:, :-1], self.hashBits)]
+        return ngrams.astype(np.float64) - contexts
@@ -0,0 +1,306 @@
+"""
+Long running HTTP/JSON prediction server with micro-batching.
+
+The model file is loaded once. Lines found in the prediction cache are answered directly, the others are queued and
+scored together in micro-batches of at most --maxBatchSize lines, waiting at most --maxWait milliseconds for a batch
+to fill.
+
+With --pruneMargin or --decisiveMargin lines are scored with early exit, and each result also reports the number of
+n-grams scored and the final margin of its prediction.
+
+    POST /predict  {"text": "..."} or {"texts": ["...", ...]}
+    GET  /metrics  latency percentiles, throughput, batching counters and prediction cache statistics
+    GET  /health
+"""
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import deque
+import numpy as np
+from helper import cleanText
+from modelStore import loadScorer
+from cache import PredictionCache, POLICIES
+
+parser = argparse.ArgumentParser(description='Language prediction server')
+parser.add_argument('--modelPath', default='wordLangId2.model', help='Path of the binary model file written by train')
+parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+parser.add_argument('--port', default=8080, type=int, help='Port to listen on')
+parser.add_argument('--maxBatchSize', default=64, type=int, help='Largest number of lines scored in one micro-batch')
+parser.add_argument('--maxWait', default=2.0, type=float, help='Longest time in milliseconds a request waits for its batch to fill')
+parser.add_argument('--cacheSize', default=10000, type=int, help='Number of cleaned lines whose scores are cached for repeated lines, 0 disables the cache')
+parser.add_argument('--cachePolicy', default='lru', choices=POLICIES, help='Eviction policy of the prediction cache')
+parser.add_argument('--pruneMargin', default=None, type=float, help='Stop scoring a language once its log probability is this far behind the leader')
+parser.add_argument('--decisiveMargin', default=None, type=float, help='Stop scoring a line once its leading language is this far ahead of the others')
+
+class ServerMetrics:
+    """ Latency and throughput counters of the server
+
+    Args:
+        window (int): number of most recent request latencies the percentiles are computed over
+    """
+    def __init__(self, window=10000):
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.lines = 0
+        self.batches = 0
+        self.batchedLines = 0
+        self.errors = 0
+
+    def recordBatch(self, size):
+        self.batches += 1
+        self.batchedLines += size
+
+    def recordRequest(self, latency, lines):
+        self.requests += 1
+        self.lines += lines
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        """ Return the counters as a JSON serializable dictionary, latencies are in milliseconds """
+        uptime = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1000
+        p50, p99 = np.percentile(latencies, [50, 99]).tolist() if len(latencies) else (None, None)
+        return {'uptimeSeconds': uptime, 'requests': self.requests, 'lines': self.lines, 'errors': self.errors,
+                'requestsPerSecond': self.requests / uptime, 'linesPerSecond': self.lines / uptime,
+                'latencyP50Ms': p50, 'latencyP99Ms': p99, 'batches': self.batches,
+                'meanBatchSize': self.batchedLines / self.batches if self.batches else None}
+
+class PendingRequest:
+    """ The lines of one request waiting to be scored, which may be spread over several micro-batches
+
+    Args:
+        size (int): number of lines in the request
+    """
+    def __init__(self, size):
+        self.future = asyncio.get_running_loop().create_future()
+        self.rows = [None] * size
+        self.remaining = size
+
+    def setRow(self, i, row):
+        self.rows[i] = row
+        self.remaining -= 1
+        if self.remaining == 0 and not self.future.done():
+            self.future.set_result(np.array(self.rows))
+
+class MicroBatcher:
+    """ Collects lines submitted by concurrent requests and scores them together
+
+    Args:
+        scorer (scoring.BatchScorer): scorer loaded from the model file
+        maxBatchSize (int): largest number of lines scored at once
+        maxWait (float): longest time in seconds the first line of a batch waits for more lines
+        metrics (ServerMetrics): counters the batch sizes are recorded in
+        pruneMargin (float): early exit prune margin, see scoring.BatchScorer.scoreEarlyExit, None never drops a language
+        decisiveMargin (float): early exit decisive margin, None never stops a line early
+    """
+    def __init__(self, scorer, maxBatchSize, maxWait, metrics, pruneMargin=None, decisiveMargin=None):
+        self.scorer = scorer
+        self.maxBatchSize = maxBatchSize
+        self.maxWait = maxWait
+        self.metrics = metrics
+        self.pruneMargin = pruneMargin
+        self.decisiveMargin = decisiveMargin
+        self.earlyExit = pruneMargin is not None or decisiveMargin is not None
+        self.queue = asyncio.Queue()
+
+    async def submit(self, lines):
+        """ Queue cleaned lines for scoring and wait for their N x L matrix of log probabilities
+
+        With early exit each row is followed by the number of n-grams scored and the final margin, as returned by
+        scoring.BatchScorer.earlyExitRows.
+        """
+        if not lines:
+            return np.zeros((0, len(self.scorer.languages) + (2 if self.earlyExit else 0)))
+        pending = PendingRequest(len(lines))
+        for i, line in enumerate(lines):
+            self.queue.put_nowait((line, pending, i))
+        return await pending.future
+
+    async def run(self):
+        """ Score queued lines in micro-batches until cancelled """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.maxWait
+            while len(batch) < self.maxBatchSize:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.score(batch)
+
+    def score(self, batch):
+        """ Score a micro-batch of queued lines and hand each row to its request """
+        self.metrics.recordBatch(len(batch))
+        try:
+            lines = [line for line, _, _ in batch]
+            if self.earlyExit:
+                scores = self.scorer.earlyExitRows(lines, self.pruneMargin, self.decisiveMargin)
+            else:
+                scores = self.scorer.score(lines)
+        except Exception as e:
+            for _, pending, _ in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        for row, (_, pending, i) in zip(scores, batch):
+            pending.setRow(i, row)
+
+class PredictionServer:
+    """ Serves predictions from a scorer over HTTP/JSON with keep-alive connections
+
+    Args:
+        scorer (scoring.BatchScorer): scorer loaded from the model file
+        maxBatchSize (int): largest number of lines scored at once
+        maxWait (float): longest time in seconds a line waits for its batch to fill
+        cache (cache.PredictionCache): cache of line scores consulted before queueing lines, None scores every line
+        pruneMargin (float): early exit prune margin, see scoring.BatchScorer.scoreEarlyExit, None never drops a language
+        decisiveMargin (float): early exit decisive margin, None never stops a line early
+    """
+    def __init__(self, scorer, maxBatchSize=64, maxWait=0.002, cache=None, pruneMargin=None, decisiveMargin=None):
+        self.scorer = scorer
+        self.cache = cache
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(scorer, maxBatchSize, maxWait, self.metrics, pruneMargin, decisiveMargin)
+
+    async def predict(self, texts):
+        """ Given raw texts, return the predicted language and per-language log probabilities of each one
+
+        With early exit, the languages dropped from a line score null, and each result also holds the number of
+        n-grams scored and the final margin of its prediction, null when the runner up was dropped.
+        """
+        lines = [cleanText(text) for text in texts]
+        if self.cache is None:
+            rows = await self.batcher.submit(lines)
+        else:
+            cached, missing = self.cache.lookup(lines)
+            rows = self.cache.fill(lines, cached, missing, await self.batcher.submit(missing)) if missing else cached
+        languages = self.scorer.languages
+        L = len(languages)
+        results = []
+        for row in rows:
+            scores = row[:L]
+            result = {'language': languages[int(np.argmax(scores))],
+                      'scores': {language: score if np.isfinite(score) else None
+                                 for language, score in zip(languages, scores.tolist())}}
+            if self.batcher.earlyExit:
+                result['consumed'] = int(row[L])
+                result['margin'] = float(row[L + 1]) if np.isfinite(row[L + 1]) else None
+            results.append(result)
+        return results
+
+    async def handle(self, method, path, body):
+        """ Route one request and return its status code and JSON response """
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'languages': self.scorer.languages}
+        if method == 'GET' and path == '/metrics':
+            return 200, dict(self.metrics.snapshot(), cache=self.cache.stats() if self.cache is not None else None)
+        if method == 'POST' and path == '/predict':
+            started = time.perf_counter()
+            try:
+                request = json.loads(body.decode('utf-8', errors='surrogateescape'))
+                single = 'text' in request
+                texts = [request['text']] if single else request['texts']
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError('texts must be a list of strings')
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.metrics.errors += 1
+                return 400, {'error': 'expected {"text": str} or {"texts": [str]}: ' + str(e)}
+            try:
+                results = await self.predict(texts)
+            except Exception as e:
+                self.metrics.errors += 1
+                logging.getLogger(__name__).exception('Scoring {0} texts failed'.format(len(texts)))
+                return 500, {'error': 'prediction failed: ' + str(e)}
+            self.metrics.recordRequest(time.perf_counter() - started, len(texts))
+            return 200, results[0] if single else {'results': results}
+        return 404, {'error': 'not found'}
+
+    async def serveConnection(self, reader, writer):
+        """ Serve the requests of one keep-alive connection """
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                parts = requestLine.decode('latin-1').split()
+                if len(parts) < 2:
+                    break
+                method, path = parts[0], parts[1]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError('negative length')
+                except ValueError as e:
+                    # The body cannot be skipped without its length, so the connection is closed after the error
+                    self.metrics.errors += 1
+                    status, response, keepAlive = 400, {'error': 'invalid Content-Length: ' + str(e)}, False
+                else:
+                    body = await reader.readexactly(length)
+                    status, response = await self.handle(method, path, body)
+                    keepAlive = headers.get('connection', '').lower() != 'close'
+                payload = json.dumps(response).encode('utf-8')
+                writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\nConnection: {3}\r\n\r\n'
+                             .format(status, 'OK' if status == 200 else 'Error', len(payload), 'keep-alive' if keepAlive else 'close')
+                             .encode('latin-1') + payload)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        """ Listen on host and port until cancelled
+
+        Args:
+            host (str): address to listen on
+            port (int): port to listen on, 0 picks a free port
+            ready (asyncio.Future): set to the bound port once the server is listening
+        """
+        logger = logging.getLogger(__name__)
+        batcher = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.serveConnection, host, port)
+        boundPort = server.sockets[0].getsockname()[1]
+        logger.info('Serving {0} on http://{1}:{2}'.format(', '.join(self.scorer.languages), host, boundPort))
+        if ready is not None:
+            ready.set_result(boundPort)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+def main(args):
+    scorer = loadScorer(args.modelPath)
+    cache = PredictionCache(args.cacheSize, args.cachePolicy) if args.cacheSize > 0 else None
+    server = PredictionServer(scorer, args.maxBatchSize, args.maxWait / 1000, cache, args.pruneMargin, args.decisiveMargin)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+    logger = logging.getLogger(__name__)
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,70 @@
+"""
+Regression tests pinning the Good Turing word models to the original implementation.
+
+The bundled wordLangId2.out was written by the original per-line dictionary code, so the batch scorer must
+reproduce it byte for byte, and the smoothed probabilities must equal those of the original formula, which summed
+the adjusted frequencies again for every bigram.
+"""
+import os
+import math
+from collections import Counter
+import numpy as np
+import pytest
+import wordLangId2
+from helper import readCorpus, createOOV
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+def originalGoodTuring(corpus, threshold=0):
+    """ Given a list of lines, return the bigram probabilities of the original Good Turing word model
+
+    Args:
+        corpus (list): list of lines from a language corpus
+        threshold (int): frequency value a word must be seen more than to be included in the vocabulary
+
+    Returns:
+        mle (dict): a dictionary of bigram keys and probability values, including (<unk>, <unk>)
+    """
+    corpus = ['<start> ' + line + ' <end>' for line in corpus]
+    unigramFreq = sum([Counter(line.split()) for line in corpus], Counter())
+    unigramFreq, OOV = createOOV(unigramFreq, threshold)
+    if unigramFreq.get('<unk>', 0) == 0:
+        unigramFreq['<unk>'] = 0
+    bigramFreq = {}
+    for line in corpus:
+        line = line.split()
+        for i in range(len(line) - 1):
+            bigram = tuple('<unk>' if word in OOV else word for word in line[i:i + 2])
+            bigramFreq[bigram] = bigramFreq.get(bigram, 0) + 1
+    if bigramFreq.get(('<unk>', '<unk>'), 0) == 0:
+        bigramFreq[('<unk>', '<unk>')] = 0
+    unkBigrams = 0
+    for unigram1 in unigramFreq.keys():
+        for unigram2 in unigramFreq.keys():
+            if bigramFreq.get((unigram1, unigram2), 0) == 0:
+                unkBigrams += 1
+    unigramGTFreq, bigramGTFreq = wordLangId2.goodTuringSmoothing(unigramFreq, bigramFreq, unkBigrams)
+    return {bigram: (bigramGTFreq[bigram] / sum(bigramGTFreq.values())) /
+                    (unigramGTFreq[bigram[0]] / sum(unigramGTFreq.values())) for bigram in bigramGTFreq.keys()}
+
+def test_predictionsMatchBundledOutput(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO)
+    outputPath = tmp_path / 'wordLangId2.out'
+    args = wordLangId2.parser.parse_args(['run', '--outputPath', str(outputPath)])
+    wordLangId2.main(args)
+    with open(os.path.join(REPO, 'wordLangId2.out'), 'rb') as f:
+        expected = f.read()
+    assert outputPath.read_bytes() == expected
+
+@pytest.mark.parametrize('language', ['English', 'French', 'Italian'])
+def test_goodTuringMatchesOriginalFormula(language):
+    corpus = readCorpus(os.path.join(REPO, 'LangId.train.' + language))[:150]
+    mle = originalGoodTuring(corpus)
+    model = wordLangId2.wordModel(corpus, 0, language, 'GT')
+
+    bigrams = [bigram for bigram, prob in mle.items() if prob > 0]
+    ids1 = np.array([model.vocab.lookup(bigram[0]) for bigram in bigrams])
+    ids2 = np.array([model.vocab.lookup(bigram[1]) for bigram in bigrams])
+    expected = np.array([math.log(mle[bigram]) for bigram in bigrams])
+    np.testing.assert_allclose(model.bigramLogProbs(ids1, ids2), expected, rtol=1e-12)
+    assert model.unkLogProb == pytest.approx(math.log(mle[('<unk>', '<unk>')]), rel=1e-12)
@@ -0,0 +1,52 @@
+"""
+Startup tests of the unified CLI: langId.py predict must classify from the memory mapped model file without importing
+the training code or reading any corpus, and must add little to the numpy import every prediction needs.
+
+Both checks hold on a busy machine. The absolute time to the first prediction depends on the machine's load, so it is
+checked by bench.py startup against --startupTarget instead.
+"""
+import os
+import sys
+import subprocess
+import pytest
+import bench
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+TEXT = 'Signora Presidente, onorevoli colleghi'
+# Modules of the training code that predicting must not import
+TRAINING_MODULES = ['cli', 'parallel', 'multiprocessing', 'registry', 'letterLangId', 'wordLangId', 'wordLangId2']
+# Longest time langId.py predict may take beyond a bare numpy import, compared on the fastest of the timed runs
+OVERHEAD_BUDGET_MS = 150.0
+# Runs langId.py predict in a fresh interpreter, then prints the names of the imported modules
+PREDICT_AND_LIST_MODULES = '''
+import sys
+import langId
+args, options = langId.parser.parse_known_args(sys.argv[1:])
+args.options = options
+langId.main(args)
+print(' '.join(sorted(sys.modules)))
+'''
+
+@pytest.fixture(scope='module')
+def modelPath(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('startup') / 'wordLangId2.model')
+    subprocess.run([sys.executable, 'langId.py', 'train', '--model', 'GT', '--modelPath', path], cwd=REPO,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return path
+
+def test_predictDoesNotImportTraining(modelPath):
+    completed = subprocess.run([sys.executable, '-c', PREDICT_AND_LIST_MODULES, 'predict', '--modelPath', modelPath, TEXT],
+                               cwd=REPO, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    prediction, modules = completed.stdout.decode('utf-8').splitlines()
+    assert prediction.split('\t')[1] == 'Italian'
+    imported = set(modules.split())
+    assert 'modelStore' in imported and 'scoring' in imported
+    assert [module for module in TRAINING_MODULES if module in imported] == []
+
+def test_predictOverheadOverNumpy(modelPath, monkeypatch):
+    monkeypatch.chdir(REPO)
+    report = bench.benchStartup(modelPath, TEXT, repeat=5)
+    assert report['langIdPredict']['prediction'] == 'Italian'
+    overhead = report['langIdPredict']['bestMs'] - report['numpyImport']['bestMs']
+    assert overhead <= OVERHEAD_BUDGET_MS, 'langId.py predict took {0:.0f} ms beyond the numpy import, over the {1:.0f} ms budget'.format(
+        overhead, OVERHEAD_BUDGET_MS)
@@ -3,18 +3,17 @@ Author: Lauren Gardiner
 Date: 11/1/18
 """
 from collections import Counter
-import argparse
+from functools import partial
 import logging
-from helper import readCorpus, loadSolution, createOOV, calcLangProbs, predictLanguage, evaluate, writeResults
+from engine import NgramCounter, Vocabulary, BigramModel, addOneModel, kneserNeyModel, bigramFrequencies
+from helper import createOOV
+import cli
+import instrumentation
 
-parser = argparse.ArgumentParser(description='Word level language model')
-parser.add_argument('--englishPath', default='LangId.train.English', help='Input path for English corpus')
-parser.add_argument('--frenchPath', default='LangId.train.French', help='Input path for French corpus')
-parser.add_argument('--italianPath', default='LangId.train.Italian', help='Input path for Italian corpus')
-parser.add_argument('--testPath', default='LangId.test', help='Input path for test corpus')
-parser.add_argument('--solutionPath', default='LangId.sol', help='Input path for solution')
-parser.add_argument('--outputPath', default='wordLangId2.out', help='Output path for predictions')
-parser.add_argument('--unkThreshold', default=0, help='Frequency threshold to be included in vocabulary')
+parser = cli.createParser('Word level language model', 'wordLangId2', unkThreshold=0)
+cli.addCompressionArguments(parser)
+parser.add_argument('--smoothing', default='GT', choices=['addOne', 'GT', 'KN'], help='Smoothing of the bigram probabilities: add one, Good Turing or interpolated Kneser-Ney')
+parser.add_argument('--discount', default=None, type=float, help='Kneser-Ney absolute discount between 0 and 1, estimated from the counts if omitted')
 
 def findGTCutoff(N_c):
     """Given a dictionary of the numbers of grams seen at each frequency, return a cutoff for good turing smoothing
@@ -69,82 +68,82 @@ def goodTuringSmoothing(unigramFreq, bigramFreq, unkBigrams):
             bigramGTFreq[k] = (bigramN_c[1] / unkBigrams)
     return unigramGTFreq, bigramGTFreq
 
-def wordModel(corpus, threshold, language, smoothing="addOne"):
+def wordModel(corpus, threshold, language, smoothing="addOne", counter=None, discount=None):
     """ This function take a corpus and an OOV threshold and returns the vocabulary and the probabilities of seeing two words.
 
     Words that are seen less than the threshold are converted to an unknown token <unk>
 
     Args:
-        corpus (list): list of lines from a language corpus
+        corpus (iterable): lines from a language corpus, such as a list or a helper.CorpusReader, iterated once
         threshold (int): frequency value a word must be seen more than to be included in the vocabulary
+        language (str): name of the language
+        smoothing (str): addOne, GT or KN
+        counter (engine.NgramCounter): counts to fold the corpus into, such as counts loaded with modelStore.loadCounters
+        discount (float): Kneser-Ney absolute discount, None estimates it from the counts
 
     Returns:
-        mle (dict): a dictionary of bigram keys and probability values for all seen bigrams
-        unigramFreq.keys() (list): vocabulary for the language corpus
+        model (engine.BigramModel): bigram log probabilities and vocabulary for the language corpus
     """
     logger = logging.getLogger(__name__)
     logger.info('Creating {0} word model'.format(language))
 
-    # Add start and end sentence tokens in each line
-    corpus = ['<start> ' + line + ' <end>' for line in corpus]
-    # Create a dictionary with character keys and frequency values
-    unigramFreq = sum([Counter(line.split()) for line in corpus], Counter())
+    # Count words and word bigrams in a single pass, adding start and end sentence tokens to each line
+    if counter is None:
+        counter = NgramCounter(wordModel=True)
+    with instrumentation.stage('count', language) as record:
+        counted = counter.position
+        counter.update(corpus)
+        record.items = counter.position - counted
+    # Create a dictionary with word keys and frequency values
+    unigramFreq = counter.unigramFrequencies()
     unigramFreq, OOV = createOOV(unigramFreq, threshold)
     # Add unknown tokens to dictionary if there are none due to a threshold of 0
     if unigramFreq.get('<unk>', 0) == 0:
         unigramFreq['<unk>'] = 0
     
-    # Create a dictionary with bigram keys and frequency values
-    bigramFreq = {}
-    for line in corpus:
-        line = line.split()
-        for i in range(len(line) - 1):
-            word1 = line[i]
-            word2 = line[i+1]
-            if word1 in OOV:
-                word1 = '<unk>'
-            if word2 in OOV:
-                word2 = '<unk>'
-            bigram = (word1, word2)
-            if bigram in bigramFreq.keys():
-                bigramFreq[bigram] += 1
-            else:
-                bigramFreq[bigram] = 1
-    # Add unknown tokens to dictionary if there are none due to a threshold of 0
-    if bigramFreq.get(('<unk>', '<unk>'), 0) == 0:
-        bigramFreq[('<unk>', '<unk>')] = 0
-    # Create unknowns for all unseen bigrams given the vocabulary
-    unkBigrams = 0
-    for unigram1 in unigramFreq.keys():
-        for unigram2 in unigramFreq.keys():
-            if bigramFreq.get((unigram1, unigram2), 0) == 0:
-                unkBigrams += 1
-    # Calculate bigram probabilities
-    if smoothing == "addOne":
-        mle = {bigram: (bigramFreq[bigram] + 1) / (unigramFreq[bigram[0]] + len(unigramFreq.keys())) 
-               for bigram in bigramFreq.keys()}
-    elif smoothing == "GT":
-        unigramGTFreq,bigramGTFreq = goodTuringSmoothing(unigramFreq, bigramFreq, unkBigrams)
-        mle = {bigram: (bigramGTFreq[bigram] / sum(bigramGTFreq.values())) / (unigramGTFreq[bigram[0]] / sum(unigramGTFreq.values())) for bigram in bigramGTFreq.keys()}
-    return mle, unigramFreq.keys()
+    # Map the bigram counts onto word ids in a sparse table, out of vocabulary words map to <unk>
+    vocab = Vocabulary(unigramFreq.keys())
+    with instrumentation.stage('buildModel', language, items=len(vocab)):
+        counts = counter.bigramCounts(vocab, dense=False)
+        # Calculate bigram probabilities
+        if smoothing == "addOne":
+            model = addOneModel(unigramFreq, counts, language, wordModel=True)
+        elif smoothing == "KN":
+            model = kneserNeyModel(counts, language, wordModel=True, discount=discount)
+        elif smoothing == "GT":
+            bigramFreq = bigramFrequencies(counts)
+            # Add unknown tokens to dictionary if there are none due to a threshold of 0
+            if bigramFreq.get(('<unk>', '<unk>'), 0) == 0:
+                bigramFreq[('<unk>', '<unk>')] = 0
+            # Create unknowns for all unseen bigrams given the vocabulary, every seen bigram is made of vocabulary words
+            unkBigrams = len(unigramFreq) ** 2 - sum(1 for freq in bigramFreq.values() if freq > 0)
+            with instrumentation.stage('goodTuringSmoothing', language, items=len(bigramFreq)):
+                unigramGTFreq, bigramGTFreq = goodTuringSmoothing(unigramFreq, bigramFreq, unkBigrams)
+            # Normalize by the total adjusted frequencies, summed once in dictionary order
+            bigramGTTotal = sum(bigramGTFreq.values())
+            unigramGTTotal = sum(unigramGTFreq.values())
+            mle = {bigram: (bigramGTFreq[bigram] / bigramGTTotal) / (unigramGTFreq[bigram[0]] / unigramGTTotal) for bigram in bigramGTFreq.keys()}
+            model = BigramModel.fromProbabilities(language, vocab, mle, dense=False, wordModel=True)
+    return model
+
+def buildScorer(args, corpora):
+    """ Given the parsed options and the corpus of every language, build the smoothed word models and return their scorer
+
+    Args:
+        args (argparse.Namespace): parsed options
+        corpora (dict): a dictionary of language keys and helper.CorpusReader values
+
+    Returns:
+        scorer (scoring.BatchScorer): scorer of the languages
+        counters (dict): a dictionary of language keys and engine.NgramCounter values
+    """
+    if args.discount is not None and not 0 < args.discount < 1:
+        parser.error('--discount must be between 0 and 1')
+    builder = partial(wordModel, smoothing=args.smoothing, discount=args.discount)
+    return cli.bigramScorer(args, corpora, builder, wordModel=True)
 
 def main(args):
-    # Load corpora and solution
-    englishCorpus = readCorpus(args.englishPath)
-    frenchCorpus = readCorpus(args.frenchPath)
-    italianCorpus = readCorpus(args.italianPath)
-    testCorpus = readCorpus(args.testPath)
-    solution = loadSolution(args.solutionPath)
-
-    # Create character models
-    englishWordModel, englishVocab = wordModel(englishCorpus, args.unkThreshold, "English", "GT")
-    frenchWordModel, frenchVocab = wordModel(frenchCorpus, args.unkThreshold, "French", "GT")
-    italianWordModel, italianVocab = wordModel(italianCorpus, args.unkThreshold, "Italian", "GT")
-
-    # Predict language
-    wordResults = predictLanguage(testCorpus, englishWordModel, englishVocab, frenchWordModel, frenchVocab, italianWordModel, italianVocab, wordModel=True)
-    evaluate(wordResults, solution)
-    writeResults(wordResults, args.outputPath)
+    cli.main(args, parser, buildScorer)
 
 if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(levelname)s - %(message)s'
@@ -152,4 +151,6 @@ if __name__ == '__main__':
     logger = logging.getLogger(__name__)
 
     args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    instrumentation.checkArguments(parser, args)
+    with instrumentation.instrumented(args):
+        main(args)
\ No newline at end of file